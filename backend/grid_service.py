@@ -1,7 +1,12 @@
 # grid_service.py
 from __future__ import annotations
 
+import hashlib
+import os
+import threading
 import time
+from typing import Callable
+
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -14,8 +19,8 @@ from utils import (
     grid_1km_wgs84,
 )
 from meteomatics import fetch_on_points, normalize_features, add_wind_uv
-from prior import load_thermals_prior, kde_prior_for_hour
-from tpi import tpi_from_live_and_prior, climb_from_tpi_and_flux
+from prior import KdeGrid, kde_grid, load_thermals_prior, kde_prior_for_hour
+from tpi import prepare_tpi_features, tpi_from_features, climb_from_tpi_and_flux
 
 
 class GridCache:
@@ -23,25 +28,78 @@ class GridCache:
         self.minutes = minutes
         self.last_ts = 0.0
         self.payload: gpd.GeoDataFrame | None = None
+        # True while an external refresher (see app.py) keeps payload current;
+        # readers then serve the stale payload instead of recomputing inline
+        self.background = False
+        self.lock = threading.Lock()
+
+    def is_fresh(self, now: float) -> bool:
+        if self.payload is None:
+            return False
+        return self.background or (now - self.last_ts) <= 60 * self.minutes
 
 
 CACHE: GridCache | None = None
 GRID_GDF: gpd.GeoDataFrame | None = None
 PRIOR_GDF: gpd.GeoDataFrame | None = None
+GRID_KDE: KdeGrid | None = None  # GRID_GDF centroids in KDE km space, built with the grid
+# KDE prior projected onto GRID_GDF, keyed by UTC hour; cleared whenever the
+# grid/prior are rebuilt
+_PRIOR_CACHE: dict[int, np.ndarray] = {}
+
+
+def _cache_path(cache_dir: str, kind: str, key: str) -> str:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{kind}_{digest}.parquet")
+
+
+def _parquet_cached(path: str, build: Callable[[], pd.DataFrame], read: Callable[[str], pd.DataFrame]):
+    """
+    Return the frame stored at `path`, or build it and try to store it there.
+    The cache is best-effort: unreadable files are rebuilt, failed writes are ignored.
+    """
+    if os.path.exists(path):
+        try:
+            return read(path)
+        except Exception:
+            pass
+    df = build()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df.to_parquet(path)
+    except Exception:
+        pass
+    return df
 
 
 def build_grid_and_prior() -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame | None]:
-    """Build the static grid once and (optionally) load the thermals prior."""
+    """
+    Build the static grid once and (optionally) load the thermals prior.
+    Both are pure functions of their inputs, so they are cached on disk as
+    parquet under GRID_CACHE_DIR (default .cache) and reused on cold starts.
+    """
     env = load_env()
     bbox = get_bbox(env)
     res_m = int(env.get("GRID_RES_M", "1000"))
+    cache_dir = env.get("GRID_CACHE_DIR", ".cache")
+    _PRIOR_CACHE.clear()
 
-    grid = grid_1km_wgs84(bbox, res_m=res_m)
+    grid = _parquet_cached(
+        _cache_path(cache_dir, "grid", f"{bbox}|{res_m}"),
+        lambda: grid_1km_wgs84(bbox, res_m=res_m),
+        gpd.read_parquet,
+    )
 
     prior_gdf = None
     prior_path = env.get("PRIOR_GEOJSON")
     if prior_path and prior_path not in ("", "None"):
-        prior_gdf = load_thermals_prior(prior_path)
+        # key on mtime too so an updated prior file invalidates the cache
+        mtime = os.path.getmtime(prior_path) if os.path.exists(prior_path) else 0.0
+        prior_gdf = _parquet_cached(
+            _cache_path(cache_dir, "prior", f"{os.path.abspath(prior_path)}|{mtime}"),
+            lambda: load_thermals_prior(prior_path),
+            pd.read_parquet,
+        )
 
     return grid, prior_gdf
 
@@ -53,6 +111,26 @@ def _current_timeslot_utc() -> pd.Timestamp:
     return pd.Timestamp.now(tz="UTC").floor("15min")
 
 
+def _prior_for_hour(hour: int) -> np.ndarray:
+    """
+    KDE prior for this UTC hour on GRID_GDF, normalized 0..1.
+    It only depends on (hour, GRID_GDF, PRIOR_GDF), so it is memoized per hour.
+    """
+    cached = _PRIOR_CACHE.get(hour)
+    if cached is not None:
+        return cached
+
+    if PRIOR_GDF is not None and "hour" in PRIOR_GDF.columns:
+        pts_this_hour = PRIOR_GDF[PRIOR_GDF["hour"] == hour]
+        prior01 = kde_prior_for_hour(pts_this_hour, GRID_KDE, bandwidth_km=2.0)
+    else:
+        # Weak uniform prior if none available
+        prior01 = np.full(len(GRID_GDF), 0.2, dtype=float)
+
+    _PRIOR_CACHE[hour] = prior01
+    return prior01
+
+
 def compute_snapshot() -> gpd.GeoDataFrame:
     """
     Build one live snapshot of the grid with model features + derived fields.
@@ -66,39 +144,29 @@ def compute_snapshot() -> gpd.GeoDataFrame:
     pw = env["METEO_PASS"]
     ts = _current_timeslot_utc()
 
-    # Ensure grid & prior are available
-    global GRID_GDF, PRIOR_GDF
-    if GRID_GDF is None or PRIOR_GDF is None:
+    # Ensure grid & prior are available; PRIOR_GDF stays None when no prior is
+    # configured, so only a missing grid triggers a (re)build
+    global GRID_GDF, PRIOR_GDF, GRID_KDE
+    if GRID_GDF is None:
         GRID_GDF, PRIOR_GDF = build_grid_and_prior()
+        GRID_KDE = kde_grid(GRID_GDF["lon"].to_numpy(), GRID_GDF["lat"].to_numpy())
 
     # Query live data on grid centroids
     lats = GRID_GDF["lat"].to_numpy()
     lons = GRID_GDF["lon"].to_numpy()
 
     live = fetch_on_points(ts, lats, lons, user, pw)
-    live = normalize_features(live)  # keeps safe column names with underscores
+    live = normalize_features(live, inplace=True)  # fresh frame from fetch_on_points; no copy needed
     live = add_wind_uv(live)         # requires wind_speed_10m + wind_dir_10m if present
 
     # Build prior on this hour (KDE projected to grid)
-    if PRIOR_GDF is not None and "hour" in PRIOR_GDF.columns:
-        hour = int(ts.hour)
-        pts_this_hour = PRIOR_GDF[PRIOR_GDF["hour"] == hour]
-        grid_xy = np.vstack([GRID_GDF["lon"].values, GRID_GDF["lat"].values]).T
-        prior01 = kde_prior_for_hour(pts_this_hour, grid_xy, bandwidth_km=2.0)
-    else:
-        # Weak uniform prior if none available
-        prior01 = np.full(len(GRID_GDF), 0.2, dtype=float)
+    prior01 = _prior_for_hour(int(ts.hour))
 
     # Terrain Prominence Index and climb proxy
-    tpi = tpi_from_live_and_prior(live, prior01)
+    tpi = pd.Series(tpi_from_features(prepare_tpi_features(live), prior01), index=live.index)
     climb = climb_from_tpi_and_flux(live, tpi)
 
-    # Join back to geometry + copy selected columns if present
-    out = GRID_GDF[["cell_id", "geometry", "lat", "lon"]].copy()
-    out["tpi"] = tpi.values
-    out["climb_ms"] = climb.values
-
-    # Copy over a curated set of columns if they exist
+    # Curated set of columns to carry over if present
     wanted_cols = [
         "wind_u", "wind_v",
         "wind_speed_10m", "wind_dir_10m",
@@ -107,9 +175,17 @@ def compute_snapshot() -> gpd.GeoDataFrame:
         "global_rad",                 # NOTE: replaces invalid 'asr:W'
         "total_cloud_cover_oktas",    # safe name (no colons)
     ]
-    for col in wanted_cols:
-        if col in live.columns:
-            out[col] = live[col].values
+
+    # Assemble the output in a single allocation from plain arrays
+    columns = {
+        "cell_id": GRID_GDF["cell_id"].to_numpy(),
+        "lat": GRID_GDF["lat"].to_numpy(),
+        "lon": GRID_GDF["lon"].to_numpy(),
+        "tpi": tpi.to_numpy(),
+        "climb_ms": climb.to_numpy(),
+    }
+    columns.update({col: live[col].to_numpy() for col in wanted_cols if col in live.columns})
+    out = gpd.GeoDataFrame(columns, geometry=GRID_GDF.geometry.values, crs=GRID_GDF.crs)
 
     # Optionally add a thermal score here so /grid is ready for /thermals
     out = score_grid_for_thermals(out)
@@ -117,16 +193,43 @@ def compute_snapshot() -> gpd.GeoDataFrame:
     return out
 
 
-def get_cached_grid() -> gpd.GeoDataFrame:
-    """Return a cached snapshot; refresh every CACHE_MINUTES."""
+def _get_cache() -> GridCache:
     global CACHE
     if CACHE is None:
         CACHE = GridCache(minutes=int(load_env().get("CACHE_MINUTES", "15")))
+    return CACHE
+
 
-    now = time.time()
-    if CACHE.payload is None or (now - CACHE.last_ts) > 60 * CACHE.minutes:
+def refresh_cached_grid() -> gpd.GeoDataFrame:
+    """Compute a new snapshot and publish it to the cache."""
+    cache = _get_cache()
+    with cache.lock:
         gdf = compute_snapshot()
-        CACHE.payload = gdf
-        CACHE.last_ts = now
+        cache.payload = gdf
+        cache.last_ts = time.time()
+    return gdf
 
-    return CACHE.payload
+
+def enable_background_refresh() -> int:
+    """
+    Mark the cache as refreshed externally and return the refresh interval in
+    seconds. From then on get_cached_grid only blocks until the first snapshot.
+    """
+    cache = _get_cache()
+    cache.background = True
+    return 60 * cache.minutes
+
+
+def get_cached_grid() -> gpd.GeoDataFrame:
+    """Return a cached snapshot; refresh every CACHE_MINUTES unless refreshed in the background."""
+    cache = _get_cache()
+    if cache.is_fresh(time.time()):
+        return cache.payload
+
+    with cache.lock:
+        # another request may have refreshed it while we waited for the lock
+        now = time.time()
+        if not cache.is_fresh(now):
+            cache.payload = compute_snapshot()
+            cache.last_ts = now
+        return cache.payload
@@ -1,16 +1,28 @@
 # meteomatics.py
 import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Iterable, List, Tuple, Union, Dict, Optional
 
 
 import numpy as np
+import orjson
 import pandas as pd
 import requests
-from io import StringIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE = "https://api.meteomatics.com"
 
+# One keep-alive session for the whole process so repeated snapshots reuse
+# TLS connections; pool sized for fetch_on_points' concurrent batches.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+
 # Extend as needed; keep only parameters you know your license supports
 SUPPORTED_PARAMS = {
     "t_2m:C",
@@ -51,7 +63,11 @@ def _to_utc_iso(ts) -> str:
     raise TypeError(f"Unsupported timestamp type: {type(ts)}")
 
 def _join_coords(lats: Iterable[float], lons: Iterable[float]) -> str:
-    return "+".join(f"{la:.6f},{lo:.6f}" for la, lo in zip(lats, lons))
+    # one %-format over an interleaved flat tuple instead of a format call per point
+    flat = np.column_stack([np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)]).ravel()
+    if flat.size == 0:
+        return ""
+    return ("%.6f,%.6f+" * (flat.size // 2) % tuple(flat.tolist()))[:-1]
 
 def _clean_params(params: Iterable[str]) -> List[str]:
     cleaned, unknown = [], []
@@ -68,11 +84,27 @@ def _clean_params(params: Iterable[str]) -> List[str]:
         raise ValueError(f"No supported Meteomatics parameters left after filtering. Unknown: {unknown}")
     return cleaned
 
-def _read_csv_smart(text: str) -> pd.DataFrame:
-    # Meteomatics often uses ';' as the delimiter. Detect quickly.
-    head = text[:400]
-    sep = ";" if head.count(";") >= head.count(",") else ","
-    return pd.read_csv(StringIO(text), sep=sep)
+def _parse_json_points(content: bytes) -> Dict[str, np.ndarray]:
+    """
+    Flatten a Meteomatics JSON response for a single date into columns:
+    lat, lon, validdate and one float array per parameter, in location order.
+    """
+    data = orjson.loads(content).get("data") or []
+    if not data:
+        return {}
+    coords = data[0]["coordinates"]
+    n = len(coords)
+    cols: Dict[str, np.ndarray] = {
+        "lat": np.fromiter((c["lat"] for c in coords), dtype=float, count=n),
+        "lon": np.fromiter((c["lon"] for c in coords), dtype=float, count=n),
+        "validdate": np.array([c["dates"][0]["date"] for c in coords], dtype=object),
+    }
+    for block in data:
+        values = (c["dates"][0]["value"] for c in block["coordinates"])
+        cols[block["parameter"]] = np.fromiter(
+            (np.nan if v is None else v for v in values), dtype=float, count=n
+        )
+    return cols
 
 def fetch_on_points(
     ts,
@@ -83,10 +115,12 @@ def fetch_on_points(
     params: Optional[Iterable[str]] = None,
     timeout: int = 30,
     max_points_per_request: int = 150,  # keep URLs short and safe
+    max_workers: int = 8,
 ) -> pd.DataFrame:
     """
     Query Meteomatics at a given timestamp for the provided points.
-    Batches the request to avoid overlong URLs.
+    Batches the request to avoid overlong URLs; up to max_workers batches
+    are in flight at once over the module-level keep-alive SESSION.
     Returns a DataFrame with one row per point and columns per parameter (+ metadata).
     """
     if params is None:
@@ -96,8 +130,8 @@ def fetch_on_points(
     ts_str = _to_utc_iso(ts)
     param_str = ",".join(cleaned)
 
-    lats = list(lats)
-    lons = list(lons)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
     assert len(lats) == len(lons), "lats and lons length mismatch"
 
     # Keep original order via an index
@@ -108,58 +142,51 @@ def fetch_on_points(
         for i in range(0, len(seq), n):
             yield i, seq[i:i+n]
 
-    frames = []
+    chunks = []
     for start_idx, idx_chunk in _chunks(idx, max_points_per_request):
-        lat_chunk = [lats[i] for i in idx_chunk]
-        lon_chunk = [lons[i] for i in idx_chunk]
-        coords_str = _join_coords(lat_chunk, lon_chunk)
-        url = f"{BASE}/{ts_str}/{param_str}/{coords_str}/csv"
+        coords_str = _join_coords(lats[idx_chunk], lons[idx_chunk])
+        url = f"{BASE}/{ts_str}/{param_str}/{coords_str}/json"
+        chunks.append((idx_chunk, url))
+
+    auth = (user, password)
 
-        resp = requests.get(url, auth=(user, password), timeout=timeout)
+    def _get(url: str) -> Dict[str, np.ndarray]:
+        resp = SESSION.get(url, auth=auth, timeout=timeout)
         # If a proxy/server still complains about URL length, reduce max_points_per_request (e.g., 80)
         resp.raise_for_status()
-
-        df_chunk = _read_csv_smart(resp.text)
-
-        # Add friendlier param columns if needed
-        for p in cleaned:
-            matches = [c for c in df_chunk.columns if c.startswith(p)]
-            if matches and p not in df_chunk.columns:
-                df_chunk[p] = df_chunk[matches[0]]
-
-        # Attach a stable order key by re-parsing lat/lon into a merge key
-        # Meteomatics returns columns named like 'lat', 'lon' or variants; normalize them.
-        lat_col = next((c for c in df_chunk.columns if c.lower() == "lat"), None)
-        lon_col = next((c for c in df_chunk.columns if c.lower() == "lon"), None)
-        if lat_col is None or lon_col is None:
-            # Fall back: try to detect columns that look like latitude/longitude
-            candidates = [c for c in df_chunk.columns if c.lower().endswith("(lat)") or c.lower().endswith("(lon)")]
-            # If still missing, we just append in the incoming order (chunk-local)
-        # Build a merge key that matches the input points (rounded to 6 decimals like we sent)
-        df_chunk["__lat_key"] = df_chunk[lat_col].round(6) if lat_col else np.array(lat_chunk).round(6)
-        df_chunk["__lon_key"] = df_chunk[lon_col].round(6) if lon_col else np.array(lon_chunk).round(6)
-
-        # Map input order to keys
-        key_map = pd.DataFrame({
-            "__lat_key": np.array(lat_chunk).round(6),
-            "__lon_key": np.array(lon_chunk).round(6),
-            "__idx": idx_chunk
-        })
-        df_chunk = df_chunk.merge(key_map, on=["__lat_key","__lon_key"], how="left")
-
-        frames.append(df_chunk)
-
-    if not frames:
-        return pd.DataFrame()
-
-    df = pd.concat(frames, ignore_index=True)
-
-    # Sort back to original point order
-    if "__idx" in df.columns:
-        df.sort_values("__idx", inplace=True)
-        df.drop(columns=["__idx","__lat_key","__lon_key"], errors="ignore", inplace=True)
-
-    return df
+        return _parse_json_points(resp.content)
+
+    # Network latency dominates, so issue the batches concurrently; each worker
+    # also parses its own response
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        parsed = list(pool.map(_get, [url for _, url in chunks]))
+
+    # Write each chunk into its positional slice of preallocated columns:
+    # one allocation per column, no concat and no re-sort.
+    n = len(lats)
+    columns: Dict[str, np.ndarray] = {}
+    for (idx_chunk, _), chunk_cols in zip(chunks, parsed):
+        # Meteomatics returns locations in the order they were sent,
+        # so align positionally rather than joining on rounded float coordinates.
+        n_rows = len(chunk_cols["lat"]) if chunk_cols else 0
+        if n_rows != len(idx_chunk):
+            raise ValueError(
+                f"Meteomatics returned {n_rows} locations for {len(idx_chunk)} points"
+            )
+
+        for c, values in chunk_cols.items():
+            dest = columns.get(c)
+            if dest is None:
+                # numeric -> float64 NaN-filled, anything else -> object None-filled,
+                # so points from chunks lacking a column stay missing
+                if values.dtype.kind in "biuf":
+                    dest = np.full(n, np.nan)
+                else:
+                    dest = np.full(n, None, dtype=object)
+                columns[c] = dest
+            dest[idx_chunk] = values
+
+    return pd.DataFrame(columns)
 
 
 # ---------- Helpers your grid_service expects ----------
@@ -173,11 +200,18 @@ def wind_uv(
     to u, v (m/s) in the standard math/CF convention:
         u: +eastward, v: +northward.
     """
-    rad = np.deg2rad(dir_deg)
+    # float32 is plenty for wind and halves the memory traffic; every step
+    # below allocates a fresh buffer once and then works in place.
+    neg_s = np.array(speed_ms, dtype=np.float32)
+    np.negative(neg_s, out=neg_s)
+    rad = np.array(dir_deg, dtype=np.float32)
+    np.deg2rad(rad, out=rad)
     # meteorological direction = FROM theta (clockwise from north)
     # u = -speed * sin(theta), v = -speed * cos(theta)
-    u = -np.asarray(speed_ms) * np.sin(rad)
-    v = -np.asarray(speed_ms) * np.cos(rad)
+    u = np.sin(rad)
+    u *= neg_s
+    v = np.cos(rad, out=rad)
+    v *= neg_s
     return u, v
 
 
@@ -204,21 +238,28 @@ def normalize_features(
     df: pd.DataFrame,
     exclude: Tuple[str, ...] = ("validdate", "time", "valid_time", "lat", "lon"),
     eps: float = 1e-9,
+    inplace: bool = False,
 ) -> pd.DataFrame:
     """
     Simple z-score normalization of numeric columns (per snapshot),
-    leaving coordinate/time columns intact. Returns a NEW DataFrame.
+    leaving coordinate/time columns intact. Returns a NEW DataFrame unless
+    inplace=True, in which case df itself is modified and returned.
     """
-    out = df.copy()
+    out = df if inplace else df.copy()
     # Attempt to add u/v if the raw wind columns exist
     if "wind_speed_10m:ms" in out.columns and "wind_dir_10m:d" in out.columns:
-        u, v = wind_uv(out["wind_speed_10m:ms"].values, out["wind_dir_10m:d"].values)
+        u, v = wind_uv(out["wind_speed_10m:ms"].to_numpy(), out["wind_dir_10m:d"].to_numpy())
         out["wind_u_10m:ms"] = u
         out["wind_v_10m:ms"] = v
 
     num_cols = [c for c in out.columns if c not in exclude and pd.api.types.is_numeric_dtype(out[c])]
-    for c in num_cols:
-        mu = float(np.nanmean(out[c].values))
-        sd = float(np.nanstd(out[c].values))
-        out[c] = (out[c] - mu) / (sd + eps)
+    if num_cols:
+        # one contiguous 2D pass instead of a Series round-trip per column
+        # copy=True: under copy-on-write to_numpy may hand back a read-only view
+        block = out[num_cols].to_numpy(dtype=np.float32, copy=True)
+        mu = np.nanmean(block, axis=0)
+        sd = np.nanstd(block, axis=0)
+        block -= mu
+        block /= sd + eps
+        out[num_cols] = block
     return out
@@ -1,8 +1,52 @@
+from dataclasses import dataclass
+
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
-from sklearn.neighbors import KernelDensity
+
+from utils import numba  # None when not installed; fall back to sklearn's KernelDensity
+
+KM_PER_DEG_LAT = 111.32
+
+
+@dataclass
+class KdeGrid:
+    """Grid points projected to planar km once, as contiguous float32 arrays."""
+    x_km: np.ndarray
+    y_km: np.ndarray
+    km_per_deg_lon: float
+
+
+def kde_grid(lons: np.ndarray, lats: np.ndarray) -> KdeGrid:
+    """
+    Crude small-area projection of the (static) grid: lon/lat scaled to km
+    around the grid's mid-latitude. Sample points are scaled the same way.
+    """
+    lat0 = float(np.mean(lats)) if len(lats) else 55.95
+    km_per_deg_lon = KM_PER_DEG_LAT * float(np.cos(np.radians(lat0)))
+    x_km = np.asarray(lons, dtype=np.float32) * np.float32(km_per_deg_lon)
+    y_km = np.asarray(lats, dtype=np.float32) * np.float32(KM_PER_DEG_LAT)
+    return KdeGrid(np.ascontiguousarray(x_km), np.ascontiguousarray(y_km), km_per_deg_lon)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _kde_eval(px, py, gx, gy, inv_bw2):
+        """Unnormalized Gaussian KDE: sum over samples (px, py) at each grid point (gx, gy)."""
+        m = gx.shape[0]
+        n = px.shape[0]
+        out = np.empty(m)
+        for i in numba.prange(m):
+            yx, yy = gx[i], gy[i]
+            acc = 0.0
+            for j in range(n):
+                dx = yx - px[j]
+                dy = yy - py[j]
+                acc += np.exp(-0.5 * (dx * dx + dy * dy) * inv_bw2)
+            out[i] = acc
+        return out
+
 
 def load_thermals_prior(geojson_path: str) -> gpd.GeoDataFrame:
     """
@@ -34,35 +78,26 @@ def load_thermals_prior(geojson_path: str) -> gpd.GeoDataFrame:
     # Keep only lon/lat/hour
     return gdf[["lon","lat","hour"]].dropna()
 
-def kde_prior_for_hour(points_df: pd.DataFrame, grid_xy: np.ndarray, bandwidth_km=2.0):
+def kde_prior_for_hour(points_df: pd.DataFrame, grid: KdeGrid, bandwidth_km=2.0):
     """
     Simple 2D KDE on lon/lat treated as planar via small-area scaling.
     For better accuracy, project to metric CRS before KDE (left simple for MVP).
     """
     if len(points_df) < 50:
         # too few samples → return zeros
-        return np.zeros(len(grid_xy))
-
-    # crude scale lon/lat to km around mid-lat
-    lat0 = points_df["lat"].mean() if not points_df.empty else 55.95
-    km_per_deg_lat = 111.32
-    km_per_deg_lon = km_per_deg_lat * np.cos(np.radians(lat0))
-
-    X = np.vstack([
-        (points_df["lon"].values) * km_per_deg_lon,
-        (points_df["lat"].values) * km_per_deg_lat
-    ]).T
-
-    Y = np.vstack([
-        grid_xy[:,0] * km_per_deg_lon,
-        grid_xy[:,1] * km_per_deg_lat
-    ]).T
-
-    kde = KernelDensity(bandwidth=bandwidth_km, kernel="gaussian")
-    kde.fit(X)
-    log_dens = kde.score_samples(Y)
-    dens = np.exp(log_dens)
+        return np.zeros(len(grid.x_km))
+
+    px = np.ascontiguousarray(points_df["lon"].to_numpy(dtype=np.float32) * np.float32(grid.km_per_deg_lon))
+    py = np.ascontiguousarray(points_df["lat"].to_numpy(dtype=np.float32) * np.float32(KM_PER_DEG_LAT))
+
+    if numba is not None:
+        # constant KDE factors drop out in the 0..1 normalization below
+        dens = _kde_eval(px, py, grid.x_km, grid.y_km, 1.0 / (bandwidth_km * bandwidth_km))
+    else:
+        from sklearn.neighbors import KernelDensity
+        kde = KernelDensity(bandwidth=bandwidth_km, kernel="gaussian")
+        kde.fit(np.column_stack([px, py]))
+        dens = np.exp(kde.score_samples(np.column_stack([grid.x_km, grid.y_km])))
     # normalize 0..1
-    dens = (dens - dens.min()) / (dens.ptp() + 1e-9)
+    dens = (dens - dens.min()) / (np.ptp(dens) + 1e-9)
     return dens
-
@@ -2,8 +2,12 @@
 from __future__ import annotations
 import numpy as np
 import geopandas as gpd
+import shapely
 from shapely.ops import unary_union
 from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+from utils import numba  # None when not installed; thermal_score falls back to plain NumPy
 
 def _col_or_zeros(df, name: str, n: int, dtype=float):
     """Return df[name] as a NumPy array; if missing, return zeros of length n."""
@@ -11,6 +15,15 @@ def _col_or_zeros(df, name: str, n: int, dtype=float):
         return np.asarray(df[name], dtype=dtype)
     return np.zeros(n, dtype=dtype)
 
+def _col_or_none(df, name: str) -> np.ndarray | None:
+    """Return df[name] as a float array, or None if the column is missing."""
+    if name in df.columns:
+        return df[name].to_numpy(dtype=float)
+    return None
+
+def _nanmean_at(x: np.ndarray | None, idx: np.ndarray) -> float:
+    return float(np.nanmean(x[idx])) if x is not None else float("nan")
+
 def _safe_minmax(x: np.ndarray) -> tuple[float, float]:
     x = x[~np.isnan(x)]
     if x.size == 0:
@@ -20,13 +33,58 @@ def _safe_minmax(x: np.ndarray) -> tuple[float, float]:
         return lo, lo + 1.0
     return lo, hi
 
-def score_grid_for_thermals(g):
-    n = len(g)
-    cape = _col_or_zeros(g, "cape_Jkg", n, float)
-    t2   = _col_or_zeros(g, "t_2m_C", n, float)
-    rad  = _col_or_zeros(g, "global_rad", n, float)              # we standardized to global_rad
-    tpi  = _col_or_zeros(g, "tpi", n, float)
-    ws   = _col_or_zeros(g, "wind_speed_10m", n, float)
+def _merge_cells(geoms):
+    """
+    Dissolve hot cells into blobs. Grid cells share their edge vertices exactly,
+    so they form a coverage and coverage_union_all can skip the general overlay.
+    If the input is not a clean coverage the result is invalid; fall back to unary_union.
+    """
+    merged = shapely.coverage_union_all(geoms)
+    if merged.is_valid:
+        return merged
+    return unary_union(geoms)
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _clip01(x):
+        # NaN passes through, as with np.clip
+        if x < 0.0:
+            return 0.0
+        if x > 1.0:
+            return 1.0
+        return x
+
+    @numba.njit(cache=True)
+    def _nan_minmax(x):
+        """nanmin and nanmax in one sweep; NaN, NaN if x has no finite values."""
+        lo, hi = np.inf, -np.inf
+        for v in x:
+            if v < lo:
+                lo = v
+            if v > hi:
+                hi = v
+        if lo > hi:
+            return np.nan, np.nan
+        return lo, hi
+
+    @numba.njit(parallel=True, cache=True)
+    def _score_kernel(cape, rad, tpi, ws, tpi_min, tpi_span, out):
+        """thermal_score fused into one pass over the columns."""
+        for i in numba.prange(out.shape[0]):
+            cape_z = _clip01(cape[i] / 1000.0)
+            rad_z = _clip01(rad[i] / 600.0)
+            tpi_z = _clip01((tpi[i] - tpi_min) / tpi_span)
+            wind_pen = _clip01(1.0 - ws[i] / 12.0)
+            out[i] = (0.45*cape_z + 0.35*rad_z + 0.20*tpi_z) * wind_pen
+        return out
+
+
+def thermal_score(cape: np.ndarray, rad: np.ndarray, tpi: np.ndarray, ws: np.ndarray) -> np.ndarray:
+    """Heuristic 0..1 thermal score from plain arrays (no DataFrame access)."""
+    if numba is not None:
+        cape, rad, tpi, ws = (np.ascontiguousarray(x, dtype=np.float64) for x in (cape, rad, tpi, ws))
+        tpi_min, tpi_max = _nan_minmax(tpi)
+        return _score_kernel(cape, rad, tpi, ws, tpi_min, tpi_max - tpi_min + 1e-9, np.empty_like(cape))
 
     # simple heuristic scoring (tweak as you wish)
     cape_z = np.clip(cape / 1000.0, 0, 1)                        # 0..1 scale
@@ -38,8 +96,17 @@ def score_grid_for_thermals(g):
 
     score = 0.45*cape_z + 0.35*rad_z + 0.20*tpi_z
     score *= wind_pen
+    return score
 
-    g["thermal_score"] = score
+
+def score_grid_for_thermals(g):
+    n = len(g)
+    cape = _col_or_zeros(g, "cape_Jkg", n, float)
+    rad  = _col_or_zeros(g, "global_rad", n, float)              # we standardized to global_rad
+    tpi  = _col_or_zeros(g, "tpi", n, float)
+    ws   = _col_or_zeros(g, "wind_speed_10m", n, float)
+
+    g["thermal_score"] = thermal_score(cape, rad, tpi, ws)
     return g
 
 
@@ -47,21 +114,27 @@ def grid_to_thermals(
     scored_grid: gpd.GeoDataFrame,
     score_quantile: float = 0.90,
     min_cells_per_blob: int = 3,
+    min_score: float = 0.0,
+    min_radius_m: float = 300.0,
+    max_radius_m: float = 1500.0,
 ) -> gpd.GeoDataFrame:
     """
     Select high-score cells, merge contiguous polygons, and emit one point per blob.
-    Returns a GeoDataFrame of Point features with summary props.
+    Cells must be in the top score_quantile and score at least min_score.
+    Returns a GeoDataFrame of Point features with summary props, including
+    score, climb_ms and an equal-area radius_m clipped to [min_radius_m, max_radius_m].
     """
     if "thermal_score" not in scored_grid.columns:
         raise ValueError("grid_to_thermals expects 'thermal_score' column. Call score_grid_for_thermals first.")
 
     thr = float(np.nanquantile(scored_grid["thermal_score"].to_numpy(), score_quantile))
+    thr = max(thr, min_score)
     hot = scored_grid[scored_grid["thermal_score"] >= thr].copy()
     if hot.empty:
         return gpd.GeoDataFrame(geometry=[], crs=scored_grid.crs)
 
     # Merge touching cells; unary_union returns (Multi)Polygon(s)
-    merged = unary_union(hot.geometry.values)
+    merged = _merge_cells(hot.geometry.values)
 
     # Make iterable
     geoms = []
@@ -70,20 +143,37 @@ def grid_to_thermals(
     elif merged.geom_type == "MultiPolygon":
         geoms = list(merged.geoms)
 
+    # Per-cell arrays pulled once; blob members are found through a spatial index
+    cells = hot.geometry.values
+    tree = STRtree(cells)
+    scores = hot["thermal_score"].to_numpy(dtype=float)
+    climb = _col_or_none(hot, "climb_ms")
+    grad = _col_or_none(hot, "global_rad")
+    cape = _col_or_none(hot, "cape_Jkg")
+    tpi = _col_or_none(hot, "tpi")
+
     # For each blob, compute centroid and summary stats from member cells
     rows = []
     for poly in geoms:
-        members = hot[hot.geometry.intersects(poly)]
-        if len(members) < min_cells_per_blob:
+        idx = tree.query(poly, predicate="intersects")
+        if idx.size < min_cells_per_blob:
             continue
         centroid = poly.representative_point()  # inside the polygon
+        # lon/lat degrees^2 -> m^2 around the blob, then radius of an equal-area circle
+        area_m2 = poly.area * (111320.0 ** 2) * np.cos(np.radians(centroid.y))
+        radius_m = float(np.clip(np.sqrt(area_m2 / np.pi), min_radius_m, max_radius_m))
+        member_scores = scores[idx]
+        score_mean = float(np.nanmean(member_scores))
         props = {
-            "n_cells": int(len(members)),
-            "score_mean": float(np.nanmean(members["thermal_score"])),
-            "score_max": float(np.nanmax(members["thermal_score"])),
-            "global_rad_mean": float(np.nanmean(members.get("global_rad", np.nan))),
-            "cape_mean": float(np.nanmean(members.get("cape_Jkg", np.nan))),
-            "tpi_mean": float(np.nanmean(members.get("tpi", np.nan))),
+            "score": score_mean,
+            "climb_ms": _nanmean_at(climb, idx),
+            "radius_m": radius_m,
+            "n_cells": int(idx.size),
+            "score_mean": score_mean,
+            "score_max": float(np.nanmax(member_scores)),
+            "global_rad_mean": _nanmean_at(grad, idx),
+            "cape_mean": _nanmean_at(cape, idx),
+            "tpi_mean": _nanmean_at(tpi, idx),
         }
         rows.append((centroid, props))
 
@@ -10,35 +10,58 @@ W = {
     "lapse": 0.20,   # proxy from t_2m - t_850
 }
 
+# Normalized live columns feeding the TPI, keyed like W; lapse is derived
+FEATURE_COLS = [("cape", "cape:Jkg_norm"),
+                ("asr", "asr:W_norm"),
+                ("t_2m", "t_2m:C_norm"),
+                ("cloud", "total_cloud_cover:octas_norm")]
+TPI_FEATURES = [base for base, _ in FEATURE_COLS] + ["lapse"]
+W_VEC = np.array([W[k] for k in TPI_FEATURES], dtype=np.float64)
+
+def _lapse_norm_array(df: pd.DataFrame) -> np.ndarray | None:
+    if "t_2m:C" in df.columns and "t_850hPa:C" in df.columns:
+        raw = df["t_2m:C"].to_numpy(dtype=float) - df["t_850hPa:C"].to_numpy(dtype=float)
+        lo, hi = np.nanmin(raw), np.nanmax(raw)
+        raw -= lo
+        raw /= (hi - lo + 1e-9)
+        return raw
+    return None
+
 def compute_lapse_norm(df: pd.DataFrame) -> pd.Series:
     # crude lapse proxy: warmer surface minus cool aloft ⇒ more instability
-    if "t_2m:C" in df.columns and "t_850hPa:C" in df.columns:
-        raw = df["t_2m:C"] - df["t_850hPa:C"]
-        return (raw - raw.min()) / (raw.max() - raw.min() + 1e-9)
-    return pd.Series(0.0, index=df.index)
+    lapse = _lapse_norm_array(df)
+    if lapse is None:
+        return pd.Series(0.0, index=df.index)
+    return pd.Series(lapse, index=df.index)
+
+def prepare_tpi_features(df: pd.DataFrame) -> np.ndarray:
+    """
+    (n, 5) float64 feature matrix in TPI_FEATURES order, built once per snapshot.
+    Missing columns stay zero, so tpi_from_features needs no column checks.
+    """
+    X = np.zeros((len(df), len(TPI_FEATURES)), dtype=np.float64)
+    for j, (_, col) in enumerate(FEATURE_COLS):
+        if col in df.columns:
+            X[:, j] = df[col].to_numpy(dtype=float)
+    lapse = _lapse_norm_array(df)
+    if lapse is not None:
+        X[:, -1] = lapse
+    return X
+
+def tpi_from_features(X: np.ndarray, prior_0_1: np.ndarray) -> np.ndarray:
+    # one GEMV over the prepared matrix instead of a column lookup per feature
+    z = np.log(np.asarray(prior_0_1, dtype=float) + 1e-3)
+    z += X @ W_VEC
+    # logistic → 0..1, in place
+    np.negative(z, out=z)
+    np.exp(z, out=z)
+    z += 1.0
+    np.reciprocal(z, out=z)
+    return z
 
 def tpi_from_live_and_prior(live_df: pd.DataFrame, prior_0_1: np.ndarray) -> pd.Series:
-    # bring norms
-    feats = {}
-    for base, col in [("cape","cape:Jkg_norm"),
-                      ("asr","asr:W_norm"),
-                      ("t_2m","t_2m:C_norm"),
-                      ("cloud","total_cloud_cover:octas_norm")]:
-        feats[base] = live_df[col] if col in live_df.columns else 0.0
-
-    feats["lapse"] = compute_lapse_norm(live_df)
-
-    z = (
-        np.log(prior_0_1 + 1e-3) +
-        W["cape"]  * feats["cape"] +
-        W["asr"]   * feats["asr"]  +
-        W["t_2m"]  * feats["t_2m"] +
-        W["cloud"] * feats["cloud"]+
-        W["lapse"] * feats["lapse"]
-    )
-    # logistic → 0..1
-    tpi = 1.0 / (1.0 + np.exp(-z))
-    return pd.Series(tpi, index=live_df.index)
+    # convenience for callers holding a DataFrame; the grid path prepares X itself
+    return pd.Series(tpi_from_features(prepare_tpi_features(live_df), prior_0_1), index=live_df.index)
 
 def climb_from_tpi_and_flux(live_df: pd.DataFrame, tpi: pd.Series) -> pd.Series:
     """
@@ -1,12 +1,21 @@
+import functools
 import os
 from dataclasses import dataclass
-from typing import Tuple, Dict
+from types import MappingProxyType
+from typing import Tuple, Dict, Mapping
 
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
+from pyproj import Transformer
 from shapely.geometry import box
 
+try:
+    import numba
+except ImportError:  # optional accelerator; each user keeps a NumPy / sklearn path
+    numba = None
+
 @dataclass
 class BBox:
     min_lon: float
@@ -21,12 +30,15 @@ def _strip_inline_comment(val: str) -> str:
     val = val.strip().strip('"').strip("'")
     return val
 
-def load_env() -> Dict[str, str]:
+@functools.lru_cache(maxsize=1)
+def load_env() -> Mapping[str, str]:
     """
     Minimal .env loader that:
       - ignores lines starting with '#'
       - supports inline comments after values
       - merges with real environment variables (real env wins)
+    The result is read once per process and returned as a read-only mapping;
+    call load_env.cache_clear() to pick up changes.
     """
     env: Dict[str, str] = {}
     if os.path.exists(".env"):
@@ -40,10 +52,10 @@ def load_env() -> Dict[str, str]:
                 v = _strip_inline_comment(v)
                 env[k] = v
     # merge os.environ on top (system env has priority)
-    env |= {k: v for k, v in os.environ.items()}
-    return env
+    env.update(os.environ)
+    return MappingProxyType(env)
 
-def get_bbox(env: Dict[str, str]) -> BBox:
+def get_bbox(env: Mapping[str, str]) -> BBox:
     return BBox(
         float(env.get("BBOX_MIN_LON")),
         float(env.get("BBOX_MIN_LAT")),
@@ -91,23 +103,35 @@ def grid_1km_wgs84(bbox: BBox, res_m: int = 1000) -> gpd.GeoDataFrame:
     xs = np.arange(minx, maxx, res_m, dtype=float)
     ys = np.arange(miny, maxy, res_m, dtype=float)
 
-    cells = [box(x, y, x + res_m, y + res_m) for x in xs for y in ys]
+    # All cells in one GEOS call; x-major order matches the old nested loop
+    X, Y = np.meshgrid(xs, ys, indexing="ij")
+    x0, y0 = X.ravel(), Y.ravel()
+    x1, y1 = x0 + res_m, y0 + res_m
+    corners = np.empty((x0.size, 5, 2), dtype=float)
+    corners[:, 0, 0], corners[:, 0, 1] = x0, y0
+    corners[:, 1, 0], corners[:, 1, 1] = x1, y0
+    corners[:, 2, 0], corners[:, 2, 1] = x1, y1
+    corners[:, 3, 0], corners[:, 3, 1] = x0, y1
+    corners[:, 4] = corners[:, 0]
+    cells = shapely.polygons(corners)
+
     grid_proj = gpd.GeoDataFrame(
         {"cell_id": np.arange(len(cells), dtype=int)},
         geometry=cells,
         crs=local_crs,
     )
 
-    # Compute centroids in projected CRS, then convert to WGS84
-    centroids_proj = grid_proj.geometry.centroid
-    centroids_geo = gpd.GeoSeries(centroids_proj, crs=local_crs).to_crs(wgs84)
+    # Centroids of axis-aligned squares are known in closed form; transform
+    # them to WGS84 in one bulk pyproj call
+    to_wgs84 = Transformer.from_crs(local_crs, wgs84, always_xy=True)
+    centroid_lon, centroid_lat = to_wgs84.transform(x0 + res_m / 2.0, y0 + res_m / 2.0)
 
     # Reproject grid polygons to WGS84 for output
     grid = grid_proj.to_crs(wgs84)
 
     # Attach centroid lon/lat
-    grid["lon"] = centroids_geo.x
-    grid["lat"] = centroids_geo.y
+    grid["lon"] = centroid_lon
+    grid["lat"] = centroid_lat
 
     return grid
 
@@ -17,11 +17,20 @@ python glide_route_ascii_astar.py
 """
 
 import math
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, is_dataclass
 from typing import Optional, Tuple, List, Dict
 import heapq
 import json
 
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional: plan files are written with the stdlib json module
+    orjson = None
+
+from leg_kernel import sim_leg_geom, sim_legs_batch
+
 # ---------------------------
 # Constants & simple util
 # ---------------------------
@@ -62,6 +71,20 @@ def destination_point(lat: float, lon: float, bearing_deg: float, distance_m: fl
 
     return (math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180)
 
+def destination_points(lat: float, lon: float, bearing_deg: float,
+                       distances_m: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """destination_point for many distances along one great circle."""
+    delta = np.asarray(distances_m, dtype=float) / EARTH_RADIUS_M
+    th = math.radians(bearing_deg)
+    phi1 = math.radians(lat)
+    sinp1, cosp1 = math.sin(phi1), math.cos(phi1)
+    sind, cosd = np.sin(delta), np.cos(delta)
+
+    sinp2 = sinp1 * cosd + cosp1 * sind * math.cos(th)
+    phi2 = np.arcsin(sinp2)
+    lam2 = math.radians(lon) + np.arctan2(math.sin(th) * sind * cosp1, cosd - sinp1 * sinp2)
+    return np.degrees(phi2), (np.degrees(lam2) + 540) % 360 - 180
+
 def isa_density_approx(h_m: float) -> float:
     T0 = 288.15
     L = 0.0065
@@ -77,7 +100,7 @@ def isa_density_approx(h_m: float) -> float:
 # Glider polar & met
 # ---------------------------
 
-@dataclass
+@dataclass(slots=True)
 class Polar:
     a: float
     b: float
@@ -92,7 +115,7 @@ class Polar:
             return max(25.0, B / (2*A)) if A > 0 else 35.0
         return max(10.0, (-B + math.sqrt(disc)) / (2*A))
 
-@dataclass
+@dataclass(slots=True)
 class MetSample:
     wind_speed_ms: float
     wind_dir_from_deg: float
@@ -100,6 +123,16 @@ class MetSample:
     rho: Optional[float] = None
 
 class MetProvider:
+    # Whether sample() depends on lat/lon. If not, the leg integrator never
+    # steps positions along the leg.
+    location_dependent = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # A subclass that overrides sample() is assumed spatial unless it says otherwise
+        if "sample" in cls.__dict__ and "location_dependent" not in cls.__dict__:
+            cls.location_dependent = True
+
     def __init__(self, wind_speed_ms: float = 8.0, wind_dir_from_deg: float = 260.0, w_air_ms: float = 0.0):
         self.ws = wind_speed_ms
         self.wdir = wind_dir_from_deg
@@ -116,7 +149,7 @@ def wind_along_track_ms(wind_speed_ms: float, wind_dir_from_deg: float, track_de
     delta = math.radians((blow_to_deg - track_deg + 540.0) % 360.0 - 180.0)
     return wind_speed_ms * math.cos(delta)
 
-@dataclass
+@dataclass(slots=True)
 class LegSimResult:
     required_start_h_msl: float
     expected_arrival_h_msl: float
@@ -127,35 +160,60 @@ def simulate_leg_and_requirements(
     start_lat: float, start_lon: float, start_h_msl: float,
     end_lat: float, end_lon: float, arrival_floor_msl: float,
     polar: Polar, met: MetProvider,
-    mc_value_ms: float = 0.0, step_m: float = 1000.0
+    mc_value_ms: float = 0.0, step_m: float = 1000.0,
+    edge_geom: Optional[Tuple[float, float]] = None,
+    V_ias: Optional[float] = None
 ) -> LegSimResult:
     """Integrate along edge; compute expected arrival height if starting at start_h_msl,
        the required start height to arrive at arrival_floor_msl, and cruise time.
+       edge_geom is an optional precomputed (distance_m, track_deg) for the edge;
+       V_ias an optional precomputed polar.maccready_speed_ias(mc_value_ms).
     """
-    total_D = haversine_m(start_lat, start_lon, end_lat, end_lon)
-    track = initial_bearing_deg(start_lat, start_lon, end_lat, end_lon)
+    if edge_geom is None:
+        edge_geom = (haversine_m(start_lat, start_lon, end_lat, end_lon),
+                     initial_bearing_deg(start_lat, start_lon, end_lat, end_lon))
+    total_D, track = edge_geom
+    if V_ias is None:
+        V_ias = polar.maccready_speed_ias(mc_value_ms)
+    sink = polar.sink_ms(V_ias)  # constant along the leg (IAS-based)
+
+    if type(polar) is Polar and type(met) is MetProvider:
+        # Stock polar + uniform met: run the compiled scalar kernel
+        required_start, expected_arrival, t_s, total_D = sim_leg_geom(
+            start_h_msl, total_D, track, arrival_floor_msl,
+            V_ias, sink, met.ws, met.wdir, met.wair, step_m,
+        )
+        return LegSimResult(required_start_h_msl=required_start,
+                            expected_arrival_h_msl=expected_arrival,
+                            travel_time_s=t_s,
+                            distance_m=total_D)
+
     n_steps = max(1, int(math.ceil(total_D / step_m)))
     ds = total_D / n_steps
 
-    V_ias = polar.maccready_speed_ias(mc_value_ms)
+    # Sample positions at the start of each step, all at once; a uniform met
+    # provider gets the start point throughout
+    if met.location_dependent:
+        lats, lons = destination_points(start_lat, start_lon, track, ds * np.arange(n_steps))
+        positions = zip(lats.tolist(), lons.tolist())
+    else:
+        positions = [(start_lat, start_lon)] * n_steps
+
     h = start_h_msl
-    lat, lon = start_lat, start_lon
     t_s = 0.0
 
-    for _ in range(n_steps):
+    for lat, lon in positions:
         ms = met.sample(lat, lon, h)
         rho = ms.rho if ms.rho is not None else isa_density_approx(h)
         V_tas = V_ias * math.sqrt(RHO0 / max(0.3, rho))
         Vg_parallel = max(0.1, V_tas + wind_along_track_ms(ms.wind_speed_ms, ms.wind_dir_from_deg, track))
 
-        sink = polar.sink_ms(V_ias)
         dh_dt = ms.w_air_ms - sink                  # m/s
         dt = ds / Vg_parallel                       # s
         dh = dh_dt * dt                             # m
 
         h += dh
         t_s += dt
-        lat, lon = destination_point(lat, lon, track, ds)
 
     expected_arrival = h
     required_start = start_h_msl + (arrival_floor_msl - expected_arrival)
@@ -164,11 +222,47 @@ def simulate_leg_and_requirements(
                         travel_time_s=t_s,
                         distance_m=total_D)
 
+def simulate_legs_batch(
+    start_lat: float, start_lon: float, start_h_msl: float,
+    end_lats: List[float], end_lons: List[float], arrival_floor_msl: float,
+    polar: Polar, met: MetProvider,
+    mc_value_ms: float = 0.0, step_m: float = 1000.0,
+    edge_geoms: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    V_ias: Optional[float] = None
+) -> List[LegSimResult]:
+    """simulate_leg_and_requirements for all outgoing edges of one node at once.
+       edge_geoms is an optional precomputed (distances_m, tracks_deg) pair of arrays.
+    """
+    if edge_geoms is None:
+        edge_geoms = edge_geometry(start_lat, start_lon, end_lats, end_lons)
+    dists, tracks = edge_geoms
+    if V_ias is None:
+        V_ias = polar.maccready_speed_ias(mc_value_ms)
+    if type(polar) is Polar and type(met) is MetProvider:
+        required, arrival, travel, dist = sim_legs_batch(
+            start_h_msl, dists, tracks, arrival_floor_msl,
+            V_ias, polar.sink_ms(V_ias), met.ws, met.wdir, met.wair, step_m,
+        )
+        return [LegSimResult(required_start_h_msl=float(r), expected_arrival_h_msl=float(a),
+                             travel_time_s=float(t), distance_m=float(d))
+                for r, a, t, d in zip(required, arrival, travel, dist)]
+    return [simulate_leg_and_requirements(start_lat, start_lon, start_h_msl, la, lo, arrival_floor_msl,
+                                          polar, met, mc_value_ms=mc_value_ms, step_m=step_m,
+                                          edge_geom=(float(d), float(tr)), V_ias=V_ias)
+            for la, lo, d, tr in zip(end_lats, end_lons, dists, tracks)]
+
+def edge_geometry(start_lat: float, start_lon: float,
+                  end_lats: List[float], end_lons: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """(distances_m, tracks_deg) arrays from one start point to each end point."""
+    dists = np.array([haversine_m(start_lat, start_lon, la, lo) for la, lo in zip(end_lats, end_lons)], dtype=float)
+    tracks = np.array([initial_bearing_deg(start_lat, start_lon, la, lo) for la, lo in zip(end_lats, end_lons)], dtype=float)
+    return dists, tracks
+
 # ---------------------------
 # Graph model (nodes with thermals)
 # ---------------------------
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     id: str
     lat: float
@@ -176,7 +270,7 @@ class Node:
     thermal_net_ms: float = 0.0    # net climb achievable while circling (+up). If 0, no usable thermal.
     ceiling_msl: Optional[float] = None  # maximum MSL attainable here (e.g., cloudbase). None = no limit.
 
-@dataclass
+@dataclass(slots=True)
 class StepLog:
     from_id: str
     to_id: str
@@ -186,13 +280,30 @@ class StepLog:
     depart_h_msl: float
     arrive_h_msl: float
 
-@dataclass
+@dataclass(slots=True)
 class RoutePlan:
     path: List[str]
     total_time_s: float
     final_arrival_h_msl: float
     steps: List[StepLog]
 
+def _ground_speed_bound(nodes: Dict[str, Node], start_h_msl: float, polar: Polar,
+                       met: MetProvider, V_ias: float) -> Optional[float]:
+    """Upper bound on cruise ground speed for the A* heuristic, or None if unknown.
+
+    Only stock uniform met has a known wind bound. TAS is bounded at the highest
+    altitude the glider can reach (start height or highest thermal ceiling); if that
+    is unbounded, fall back to the density clamp used by the leg integration.
+    """
+    if type(met) is not MetProvider:
+        return None
+    rho_min = 0.3
+    climbers = [n for n in nodes.values() if n.thermal_net_ms > 0.0]
+    if met.wair - polar.sink_ms(V_ias) <= 0.0 and all(n.ceiling_msl is not None for n in climbers):
+        h_top = max([start_h_msl] + [n.ceiling_msl for n in climbers])
+        rho_min = max(rho_min, isa_density_approx(h_top))
+    return V_ias * math.sqrt(RHO0 / rho_min) + abs(met.ws)
+
 def find_route_with_thermals(
     nodes: Dict[str, Node],
     edges: Dict[str, List[str]] = None,
@@ -203,9 +314,11 @@ def find_route_with_thermals(
     polar: Polar = None,
     met: MetProvider = None,
     mc_value_ms: float = 0.0,
-    step_m: float = 1000.0
+    step_m: float = 1000.0,
+    heuristic_weight: float = 1.0,
+    edge_csr: Optional[Tuple[np.ndarray, np.ndarray]] = None
 ) -> RoutePlan:
-    if edges is None:
+    if edges is None and edge_csr is None:
         edges = {"START": ["GOAL"], "GOAL": []}
     if polar is None:
         polar = Polar(a=0.3, b=0.005, c=0.0012)
@@ -220,7 +333,7 @@ def find_route_with_thermals(
 
     # If edges not supplied, make a simple forward graph:
     # START -> every other node; each non-GOAL node -> GOAL
-    if edges is None:
+    if edges is None and edge_csr is None:
         ids = list(nodes.keys())
         edges = {i: [] for i in ids}
         if "START" in nodes and "GOAL" in nodes:
@@ -235,43 +348,154 @@ def find_route_with_thermals(
 
 
     """
-    Dijkstra/A* (zero heuristic) over (node, altitude) state, minimizing total TIME.
+    A* over (node, altitude) state, minimizing total TIME.
     At each node, if altitude is insufficient to traverse an outgoing edge safely,
     the solver will climb the minimum amount at that node (if thermal available)
     up to ceiling, then evaluate the edge.
+    The heuristic is great-circle distance to goal over an upper bound on ground
+    speed, which never overestimates (it ignores climbs and headwind).
+    heuristic_weight > 1 runs weighted A*: fewer expansions, and the route found
+    is at most that factor slower than the optimum.
+    edge_csr = (indptr, indices) gives the adjacency directly as integer CSR over
+    the order of nodes, in place of edges; callers building large graphs skip the
+    string-keyed dict this way.
     """
-    # Priority queue of (total_time, node_id, altitude_msl, path, steps)
+    # Integer node ids; per-node fields as parallel arrays (NumPy for the batched
+    # leg evaluation, plain lists for the scalars read in the expansion loop)
+    ids = list(nodes)
+    id_of = {nid: i for i, nid in enumerate(ids)}
+    node_lat = np.array([nodes[n].lat for n in ids], dtype=float)
+    node_lon = np.array([nodes[n].lon for n in ids], dtype=float)
+    lat_l, lon_l = node_lat.tolist(), node_lon.tolist()
+    node_climb = [nodes[n].thermal_net_ms for n in ids]
+    node_ceiling = [nodes[n].ceiling_msl if nodes[n].ceiling_msl is not None else 1e9 for n in ids]
+    start, goal = id_of[start_id], id_of[goal_id]
+
+    # Cruise IAS depends only on the polar and MacCready setting: one value per search
+    V_ias = polar.maccready_speed_ias(mc_value_ms)
+    v_ref = _ground_speed_bound(nodes, start_h_msl, polar, met, V_ias)
+    goal_dist = [haversine_m(lat_l[i], lon_l[i], lat_l[goal], lon_l[goal]) for i in range(len(ids))]
+    h_goal = [d / v_ref for d in goal_dist] if v_ref is not None else [0.0] * len(ids)
+
+    # CSR adjacency: u's edges are indptr[u]:indptr[u+1], their targets in indices.
+    # Neighbours closest to the goal come first, so the most promising children are
+    # pushed first and win f ties. Edges are static, so each edge's geometry
+    # (distance, track) is computed once here for the batched leg evaluation.
+    indptr = [0]
+    indices: List[int] = []
+    if edge_csr is not None:
+        csr_ptr, csr_idx = (np.asarray(a).tolist() for a in edge_csr)
+        for u in range(len(ids)):
+            indices.extend(sorted(csr_idx[csr_ptr[u]:csr_ptr[u + 1]], key=goal_dist.__getitem__))
+            indptr.append(len(indices))
+    else:
+        for n in ids:
+            indices.extend(sorted((id_of[v] for v in edges.get(n, [])), key=goal_dist.__getitem__))
+            indptr.append(len(indices))
+    edge_to = np.array(indices, dtype=np.int64)
+    edge_D = np.empty(len(indices))
+    edge_track = np.empty(len(indices))
+    for u in range(len(ids)):
+        lo, hi = indptr[u], indptr[u + 1]
+        edge_D[lo:hi], edge_track[lo:hi] = edge_geometry(lat_l[u], lon_l[u], node_lat[edge_to[lo:hi]],
+                                                         node_lon[edge_to[lo:hi]])
+
+    # Priority queue of (f = time + weight * heuristic, entry, total_time, node, altitude_msl).
+    # entry indexes parents[], which holds (parent entry, StepLog into this state);
+    # path and steps are only materialized once the goal is popped. entry is unique
+    # and increases with every push, so it also breaks f ties without comparing further.
+    parents: List[Tuple[int, Optional[StepLog]]] = [(-1, None)]
     heap = []
-    heapq.heappush(heap, (0.0, start_id, start_h_msl, [start_id], []))
+    heapq.heappush(heap, (heuristic_weight * h_goal[start], 0, 0.0, start, start_h_msl))
+
+    # Fastest goal arrival pushed so far. A state whose admissible bound
+    # time + heuristic already reaches it cannot lead to a faster route.
+    best_time = math.inf
 
-    # Best known time to reach (node_id, discrete altitude bin) — we will coarsen altitude to 50 m bins
-    seen = {}
+    def reconstruct(entry: int) -> Tuple[List[str], List[StepLog]]:
+        steps = []
+        while entry > 0:
+            entry, step = parents[entry]
+            steps.append(step)
+        steps.reverse()
+        return [start_id] + [s.to_id for s in steps], steps
 
     def alt_bin(h: float) -> int:
         return int(round(h / 50.0))
 
+    # Best known time to reach (node, discrete altitude bin) — we will coarsen altitude to 50 m bins.
+    # Bins between the lowest start/floor and the highest start/finite ceiling live in a
+    # per-node row (list indexing beats both hashing and NumPy scalar access from Python);
+    # anything outside that range, e.g. above an unbounded thermal, falls back to a dict.
+    finite_ceilings = [c for c in node_ceiling if c < 1e9]
+    bin_lo = min(alt_bin(start_h_msl), alt_bin(arrival_floor_each_leg_msl)) - 1
+    bin_hi = max([alt_bin(start_h_msl)] + [alt_bin(c) for c in finite_ceilings]) + 1
+    n_bins = min(bin_hi - bin_lo + 1, 1000)
+    g_best = [[math.inf] * n_bins for _ in ids]
+    seen_far: Dict[Tuple[int, int], float] = {}
+
+    # Leg results memoized per (edge, altitude bin). Within a bin a leg is
+    # treated as a rigid shift: same height loss and cruise time, so the
+    # result for any start height h is reconstructed from that triple.
+    leg_memo: Dict[Tuple[int, int], Tuple[float, float, float]] = {}
+
+    def legs_from(u: int, h: float, es) -> List[LegSimResult]:
+        """Legs along edges es (all leaving u), departing at h."""
+        b = alt_bin(h)
+        out: List[Optional[LegSimResult]] = [None] * len(es)
+        todo = []
+        for j, e in enumerate(es):
+            hit = leg_memo.get((e, b))
+            if hit is None:
+                todo.append(j)
+                continue
+            drop, t, dist = hit
+            out[j] = LegSimResult(required_start_h_msl=arrival_floor_each_leg_msl + drop,
+                                  expected_arrival_h_msl=h - drop, travel_time_s=t, distance_m=dist)
+        if todo:
+            idx = np.array([es[j] for j in todo], dtype=np.int64)
+            fresh = simulate_legs_batch(
+                start_lat=lat_l[u], start_lon=lon_l[u], start_h_msl=h,
+                end_lats=node_lat[edge_to[idx]], end_lons=node_lon[edge_to[idx]],
+                arrival_floor_msl=arrival_floor_each_leg_msl,
+                polar=polar, met=met, mc_value_ms=mc_value_ms, step_m=step_m,
+                edge_geoms=(edge_D[idx], edge_track[idx]), V_ias=V_ias
+            )
+            for j, leg in zip(todo, fresh):
+                leg_memo[(es[j], b)] = (h - leg.expected_arrival_h_msl, leg.travel_time_s, leg.distance_m)
+                out[j] = leg
+        return out
+
     while heap:
-        t_so_far, nid, h_here, path, steps = heapq.heappop(heap)
+        _, entry, t_so_far, u, h_here = heapq.heappop(heap)
 
-        if nid == goal_id:
+        if u == goal:
+            path, steps = reconstruct(entry)
             return RoutePlan(path=path, total_time_s=t_so_far, final_arrival_h_msl=h_here, steps=steps)
-
-        key = (nid, alt_bin(h_here))
-        if key in seen and t_so_far >= seen[key]:
+        if t_so_far + h_goal[u] >= best_time:
             continue
-        seen[key] = t_so_far
 
-        node = nodes[nid]
-        for nb in edges.get(nid, []):
-            nb_node = nodes[nb]
+        b = alt_bin(h_here) - bin_lo
+        if 0 <= b < n_bins:
+            row = g_best[u]
+            if t_so_far >= row[b]:
+                continue
+            row[b] = t_so_far
+        else:
+            key = (u, b)
+            if key in seen_far and t_so_far >= seen_far[key]:
+                continue
+            seen_far[key] = t_so_far
 
-            # First: evaluate leg feasibility from current altitude WITHOUT climbing
-            leg = simulate_leg_and_requirements(
-                start_lat=node.lat, start_lon=node.lon, start_h_msl=h_here,
-                end_lat=nb_node.lat, end_lon=nb_node.lon,
-                arrival_floor_msl=arrival_floor_each_leg_msl,
-                polar=polar, met=met, mc_value_ms=mc_value_ms, step_m=step_m
-            )
+        out_edges = range(indptr[u], indptr[u + 1])
+        if not out_edges:
+            continue
+        climb_rate = node_climb[u]
+
+        # First: evaluate feasibility of every outgoing leg from current altitude WITHOUT climbing
+        legs = legs_from(u, h_here, out_edges)
+        for e, leg in zip(out_edges, legs):
+            v = indices[e]
 
             depart_h = h_here
             climb_m = 0.0
@@ -279,45 +503,115 @@ def find_route_with_thermals(
 
             if h_here + 1e-6 < leg.required_start_h_msl:
                 # Need to top-up at this node; only possible if it has usable thermal
-                if node.thermal_net_ms <= 0.0:
+                if climb_rate <= 0.0:
                     # Cannot make this edge from here (no climb); skip
                     continue
                 climb_needed = leg.required_start_h_msl - h_here
 
-                # Ceiling cap if specified
-                ceiling = node.ceiling_msl if node.ceiling_msl is not None else 1e9
-                max_possible_climb = max(0.0, ceiling - h_here)
+                # Ceiling cap (1e9 if unspecified)
+                max_possible_climb = max(0.0, node_ceiling[u] - h_here)
                 if climb_needed > max_possible_climb + 1e-6:
                     # Even climbing to ceiling is insufficient -> edge not feasible
                     continue
 
                 # Perform minimal climb to leg.required_start_h_msl at net climb rate
                 climb_m = max(0.0, climb_needed)
-                if node.thermal_net_ms <= 0.0:
-                    continue  # safety
-                climb_time = climb_m / node.thermal_net_ms  # seconds
+                climb_time = climb_m / climb_rate  # seconds
                 depart_h = h_here + climb_m
 
                 # Recompute leg after the climb (start altitude changed)
-                leg = simulate_leg_and_requirements(
-                    start_lat=node.lat, start_lon=node.lon, start_h_msl=depart_h,
-                    end_lat=nb_node.lat, end_lon=nb_node.lon,
-                    arrival_floor_msl=arrival_floor_each_leg_msl,
-                    polar=polar, met=met, mc_value_ms=mc_value_ms, step_m=step_m
-                )
+                leg = legs_from(u, depart_h, [e])[0]
 
             # After feasibility, take the edge and push new state
             arrive_h = leg.expected_arrival_h_msl
             cruise_time = leg.travel_time_s
             new_time = t_so_far + climb_time + cruise_time
-            new_path = path + [nb]
-            new_steps = steps + [StepLog(from_id=nid, to_id=nb, climbed_m=climb_m, climb_time_s=climb_time,
-                                         cruise_time_s=cruise_time, depart_h_msl=depart_h, arrive_h_msl=arrive_h)]
-            heapq.heappush(heap, (new_time, nb, arrive_h, new_path, new_steps))
+            if new_time + h_goal[v] >= best_time:
+                continue
+            if v == goal:
+                best_time = new_time
+            parents.append((entry, StepLog(from_id=ids[u], to_id=ids[v], climbed_m=climb_m, climb_time_s=climb_time,
+                                           cruise_time_s=cruise_time, depart_h_msl=depart_h, arrive_h_msl=arrive_h)))
+            heapq.heappush(heap, (new_time + heuristic_weight * h_goal[v], len(parents) - 1, new_time, v, arrive_h))
 
     # If we exhaust the heap without reaching goal
     raise RuntimeError("No feasible route to goal with given thermals and constraints.")
 
+def evaluate_path(
+    path: List[str],
+    nodes: Dict[str, Node],
+    start_h_msl: float,
+    arrival_floor_each_leg_msl: float,
+    polar: Polar,
+    met: MetProvider,
+    mc_value_ms: float = 0.0,
+    step_m: float = 1000.0
+) -> Optional[RoutePlan]:
+    """Fly a fixed node sequence with the planner's climb rule (minimal top-up at a
+       thermal, capped at its ceiling). Returns None if any leg is infeasible.
+    """
+    V_ias = polar.maccready_speed_ias(mc_value_ms)
+    h = start_h_msl
+    total = 0.0
+    steps: List[StepLog] = []
+    for a, b in zip(path, path[1:]):
+        u, v = nodes[a], nodes[b]
+        leg = simulate_leg_and_requirements(u.lat, u.lon, h, v.lat, v.lon, arrival_floor_each_leg_msl,
+                                            polar, met, mc_value_ms, step_m, V_ias=V_ias)
+        climb_m = 0.0
+        climb_time = 0.0
+        depart_h = h
+        if h + 1e-6 < leg.required_start_h_msl:
+            ceiling = u.ceiling_msl if u.ceiling_msl is not None else 1e9
+            climb_m = leg.required_start_h_msl - h
+            if u.thermal_net_ms <= 0.0 or climb_m > max(0.0, ceiling - h) + 1e-6:
+                return None
+            climb_time = climb_m / u.thermal_net_ms
+            depart_h = h + climb_m
+            leg = simulate_leg_and_requirements(u.lat, u.lon, depart_h, v.lat, v.lon, arrival_floor_each_leg_msl,
+                                                polar, met, mc_value_ms, step_m, V_ias=V_ias)
+        h = leg.expected_arrival_h_msl
+        total += climb_time + leg.travel_time_s
+        steps.append(StepLog(from_id=a, to_id=b, climbed_m=climb_m, climb_time_s=climb_time,
+                             cruise_time_s=leg.travel_time_s, depart_h_msl=depart_h, arrive_h_msl=h))
+    return RoutePlan(path=list(path), total_time_s=total, final_arrival_h_msl=h, steps=steps)
+
+def _json_default(o):
+    # stdlib fallback for what orjson encodes natively
+    if is_dataclass(o) and not isinstance(o, type):
+        return asdict(o)
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def write_json(path: str, obj) -> None:
+    """Write obj as indented UTF-8 JSON, with orjson when it is installed.
+       Dataclasses (e.g. StepLog) and NumPy scalars/arrays are encoded directly,
+       without asdict() / .tolist() copies up front. A top-level dict
+       is streamed one key at a time, so only one entry's bytes are held at once;
+       the output is byte-identical to dumping the whole dict. (json.dump already
+       writes its chunks as it encodes.)
+    """
+    if orjson is None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2, default=_json_default)
+        return
+
+    opt = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+    with open(path, "wb") as f:
+        if not isinstance(obj, dict) or not obj:
+            f.write(orjson.dumps(obj, option=opt))
+            return
+        sep = b"{\n  "
+        for key, value in obj.items():
+            # nested one level deeper: re-indent the value's lines by two spaces
+            # (encoded strings never contain a raw newline)
+            f.write(sep + orjson.dumps(str(key)) + b": " + orjson.dumps(value, option=opt).replace(b"\n", b"\n  "))
+            sep = b",\n  "
+        f.write(b"\n}")
+
 # ---------------------------
 # Demo main()
 # ---------------------------
@@ -360,14 +654,13 @@ def main():
     nodes_json = { nid: dict(lat=n.lat, lon=n.lon, thermal_net_ms=n.thermal_net_ms, ceiling_msl=n.ceiling_msl)
                 for nid, n in nodes.items() }
 
-    with open("public/plan.json", "w", encoding="utf-8") as f:
-        json.dump({
-            "path": plan.path,
-            "total_time_s": plan.total_time_s,
-            "final_arrival_h_msl": plan.final_arrival_h_msl,
-            "steps": [s.__dict__ for s in plan.steps],
-            "nodes": nodes_json
-        }, f, ensure_ascii=False, indent=2)
+    write_json("public/plan.json", {
+        "path": plan.path,
+        "total_time_s": plan.total_time_s,
+        "final_arrival_h_msl": plan.final_arrival_h_msl,
+        "steps": plan.steps,
+        "nodes": nodes_json
+    })
 
 
     # Print the plan
@@ -5,11 +5,18 @@ Fetch WeGlide thermals for a given UTC day, convert to nodes, run A* planner, an
 """
 
 from __future__ import annotations
-import math, json, argparse, sys
+import math, argparse, sys
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
 
 from weglide_client import WeGlideClient
+# numba's njit, or leg_kernel's no-op stand-in when numba is not installed:
+# the scalar helpers then run as plain Python
+from leg_kernel import njit
 # import your existing planner pieces:
 #  - Node dataclass (id, lat, lon, thermal_net_ms, ceiling_msl)
 #  - find_route_with_thermals (A* router)
@@ -18,19 +25,24 @@ from generate import (
     Polar,
     MetProvider,
     Node,
+    destination_points,
     find_route_with_thermals as astar_best_path,
+    evaluate_path,
+    write_json,
     StepLog,
     RoutePlan,
 )
 
 EARTH_R = 6371000.0
 
+@njit(cache=True, fastmath=True)
 def haversine_m(lat1, lon1, lat2, lon2):
-    φ1, λ1, φ2, λ2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    φ1, λ1, φ2, λ2 = math.radians(lat1), math.radians(lon1), math.radians(lat2), math.radians(lon2)
     dφ, dλ = φ2 - φ1, λ2 - λ1
     a = math.sin(dφ/2)**2 + math.cos(φ1)*math.cos(φ2)*math.sin(dλ/2)**2
     return 2 * EARTH_R * math.asin(math.sqrt(a))
 
+@njit(cache=True, fastmath=True)
 def initial_bearing_deg(lat1, lon1, lat2, lon2):
     φ1, φ2 = math.radians(lat1), math.radians(lat2)
     dλ = math.radians(lon2 - lon1)
@@ -38,12 +50,101 @@ def initial_bearing_deg(lat1, lon1, lat2, lon2):
     x = math.cos(φ1)*math.sin(φ2) - math.sin(φ1)*math.cos(φ2)*math.cos(dλ)
     return (math.degrees(math.atan2(y, x)) + 360) % 360
 
-def cross_track_distance_m(lat, lon, a_lat, a_lon, b_lat, b_lon):
-    """Shortest distance from point P(lat,lon) to great-circle AB, in meters."""
-    d13 = haversine_m(a_lat, a_lon, lat, lon) / EARTH_R
-    tc13 = math.radians(initial_bearing_deg(a_lat, a_lon, lat, lon))
-    tc12 = math.radians(initial_bearing_deg(a_lat, a_lon, b_lat, b_lon))
-    return abs(math.asin(math.sin(d13) * math.sin(tc13 - tc12)) * EARTH_R)
+def _unit_xyz(lats, lons):
+    """Unit vectors (n, 3) on the sphere for lat/lon in degrees."""
+    φ, λ = np.radians(lats), np.radians(lons)
+    cosφ = np.cos(φ)
+    return np.column_stack([cosφ*np.cos(λ), cosφ*np.sin(λ), np.sin(φ)])
+
+def _corridor_select(xyz, lats, lons, idx, a_lat, a_lon, b_lat, b_lon, seg_len_m, corridor_m):
+    """
+    Indices (from idx) of the points passing the corridor test, and their
+    haversine_m from A. The segment is fixed for the call, so the tests are
+    folded into one (k, 3) @ (3, 3) product against constants: with P, A, B
+    unit vectors and N the unit normal of great-circle AB,
+        haversine(A, P) <= reach  <=>  P·A >= cos(reach / R)
+        cross-track(P)  <= c      <=>  |P·N| <= sin(c / R)
+    No per-point trig; only the survivors get the exact haversine from A.
+    """
+    A, B = _unit_xyz([a_lat, b_lat], [a_lon, b_lon])
+    N = np.cross(A, B)
+    norm = np.linalg.norm(N)
+    if norm < 1e-12:
+        # A == B: initial_bearing_deg gives 0, i.e. the meridian through A
+        λa = math.radians(a_lon)
+        N, norm = np.array([-math.sin(λa), math.cos(λa), 0.0]), 1.0
+
+    reach = seg_len_m + corridor_m
+    cos_reach = math.cos(min(math.pi, reach / EARTH_R))
+    sin_corr = math.sin(min(math.pi / 2, corridor_m / EARTH_R))
+
+    dots = xyz[idx] @ np.column_stack([A, B, N / norm])
+    ok = dots[:, 0] >= cos_reach
+    ok &= dots[:, 1] >= cos_reach
+    ok &= np.abs(dots[:, 2]) <= sin_corr
+    idx = idx[ok]
+
+    # exact distance from A for the (few) survivors: the sort key
+    φ1, φ2 = math.radians(a_lat), np.radians(lats[idx])
+    dφ, dλ = φ2 - φ1, np.radians(lons[idx] - a_lon)
+    h = np.sin(dφ/2)**2 + math.cos(φ1)*np.cos(φ2)*np.sin(dλ/2)**2
+    return idx, 2 * EARTH_R * np.arcsin(np.sqrt(h))
+
+# Below this many thermals the box test costs more than it saves
+CORRIDOR_BOX_MIN_ROWS = 1000
+
+def _corridor_box(lats, lons, a_lat, a_lon, b_lat, b_lon, seg_len_m, corridor_m, n_samples=65):
+    """
+    Indices of thermals inside a lat/lon box that contains every point within
+    corridor_m of the segment (extended corridor_m past both ends), so only
+    those go through the trig refinement. Returns None where the box does not
+    simplify (near a pole or across the antimeridian).
+    """
+    span = seg_len_m + 2*corridor_m
+    brg = initial_bearing_deg(a_lat, a_lon, b_lat, b_lon)
+    s_lat, s_lon = destination_points(a_lat, a_lon, brg, np.linspace(-corridor_m, seg_len_m + corridor_m, n_samples))
+    if np.abs(np.diff(s_lon)).max(initial=0.0) > 90.0:
+        return None
+
+    # the arc can bulge off its chord between samples by up to its sagitta
+    step = span / (n_samples - 1)
+    reach = corridor_m + step*step / (8*EARTH_R) + 1000.0
+    dlat = math.degrees(reach / EARTH_R)
+    lat_lo, lat_hi = s_lat.min() - dlat, s_lat.max() + dlat
+    if lat_lo <= -89.0 or lat_hi >= 89.0:
+        return None
+    cos_min = math.cos(math.radians(max(-lat_lo, lat_hi)))
+    dlon = math.degrees(math.asin(min(1.0, math.sin(reach / EARTH_R) / cos_min)))
+
+    # four comparisons folded into one mask through a single scratch buffer
+    box = np.greater_equal(lats, lat_lo)
+    tmp = np.empty_like(box)
+    np.logical_and(box, np.less_equal(lats, lat_hi, out=tmp), out=box)
+    np.logical_and(box, np.greater_equal(lons, s_lon.min() - dlon, out=tmp), out=box)
+    np.logical_and(box, np.less_equal(lons, s_lon.max() + dlon, out=tmp), out=box)
+    return np.flatnonzero(box)
+
+def prune_path(plan_obj: RoutePlan, nodes_dict: Dict[str, Node], polar: Polar, met: MetProvider,
+               mc: float, floor: float, start_h_msl: float, step_m: float = 1000.0) -> RoutePlan:
+    """
+    Greedy line-of-sight pass over a solved route: walking back from the goal,
+    drop path[i] when flying path[i-1] -> path[i+1] directly is feasible and
+    not slower overall. Each candidate path is re-flown with evaluate_path.
+    A* is already time-optimal over its edges, so this only bites on detours
+    the graph forced (no direct edge) or near-ties from its altitude bins.
+    """
+    path = list(plan_obj.path)
+    best = evaluate_path(path, nodes_dict, start_h_msl, floor, polar, met, mc, step_m)
+    if best is None:
+        return plan_obj
+    i = len(path) - 2
+    while i >= 1:
+        cand = path[:i] + path[i + 1:]
+        trial = evaluate_path(cand, nodes_dict, start_h_msl, floor, polar, met, mc, step_m)
+        if trial is not None and trial.total_time_s <= best.total_time_s + 1e-6:
+            path, best = cand, trial
+        i -= 1
+    return best if len(path) < len(plan_obj.path) else plan_obj
 
 def parse_day_to_unix(day_str: Optional[str]) -> int:
     if day_str:
@@ -60,14 +161,22 @@ def to_iso(ts) -> Optional[str]:
     except Exception:
         return None
 
+def _to_unix(ts) -> Optional[float]:
+    try:
+        t = float(ts)
+    except (TypeError, ValueError):
+        return None
+    return t if math.isfinite(t) else None
+
 def normalize_weglide_item(item) -> Optional[Dict[str, Any]]:
     # Flexible normalizer (array/dict)
     if isinstance(item, (list, tuple)) and len(item) >= 3:
         rec = {"lon": float(item[1]), "lat": float(item[2])}
         if len(item) >= 4: rec["alt_base_m"] = item[3]
         if len(item) >= 5: rec["alt_top_m"]  = item[4]
-        if len(item) >= 6: rec["t_start"]    = to_iso(item[5])
-        if len(item) >= 7: rec["t_end"]      = to_iso(item[6])
+        # WeGlide sends unix seconds; keep them raw (ISO text is only built for output)
+        if len(item) >= 6: rec["_t_start_unix"] = _to_unix(item[5])
+        if len(item) >= 7: rec["_t_end_unix"]   = _to_unix(item[6])
         try: rec["id"] = int(item[0])
         except Exception: pass
         return rec
@@ -82,76 +191,132 @@ def normalize_weglide_item(item) -> Optional[Dict[str, Any]]:
         return out
     return None
 
-def estimate_net_ms(rec: Dict[str, Any], default_net: float = 1.8) -> float:
+def _num(x) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return math.nan
+
+@lru_cache(maxsize=4096)
+def _parse_iso_unix(text: str) -> float:
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return math.nan
+
+def _iso_to_unix(text) -> float:
+    """ISO text -> unix seconds, NaN if unparseable. WeGlide times cluster on
+       whole minutes, so parses are memoized per distinct string."""
+    return _parse_iso_unix(text) if isinstance(text, str) else math.nan
+
+@dataclass
+class ThermalTable:
     """
-    Estimate net climb from alt_top/base and time window; fallback to default.
+    Thermals as parallel arrays (structure of arrays), NaN where a field is
+    missing. net_ms / ceiling come from pack_thermals (net climb estimate and the
+    +1000 m base rule).
+    t_start_text / t_end_text keep ISO text as received from dict-form records;
+    alt_base_raw / alt_top_raw keep the heights as received (WeGlide sends ints)
+    for the export.
     """
-    alt_base = rec.get("alt_base_m")
-    alt_top  = rec.get("alt_top_m")
-    t_start  = rec.get("t_start")
-    t_end    = rec.get("t_end")
-    try:
-        if alt_base is not None and alt_top is not None and t_start and t_end:
-            t0 = datetime.fromisoformat(t_start).timestamp()
-            t1 = datetime.fromisoformat(t_end).timestamp()
-            dt = max(1.0, t1 - t0)
-            dz = float(alt_top) - float(alt_base)
-            return max(0.2, min(6.0, dz / dt))
-    except Exception:
-        pass
-    return default_net
+    lat: np.ndarray
+    lon: np.ndarray
+    alt_base: np.ndarray
+    alt_top: np.ndarray
+    t0: np.ndarray  # unix seconds
+    t1: np.ndarray
+    net_ms: np.ndarray
+    ceiling: np.ndarray
+    xyz: np.ndarray  # (n, 3) unit vectors for the corridor test, converted once
+    t_start_text: np.ndarray  # object: str or None
+    t_end_text: np.ndarray
+    alt_base_raw: np.ndarray  # object: value as received, or None
+    alt_top_raw: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def take(self, idx) -> "ThermalTable":
+        return ThermalTable(**{k: v[idx] for k, v in vars(self).items()})
+
+    def iso_times(self) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+        def col(text, ts):
+            return [t if t is not None else (to_iso(u) if math.isfinite(u) else None)
+                    for t, u in zip(text.tolist(), ts.tolist())]
+        return col(self.t_start_text, self.t0), col(self.t_end_text, self.t1)
+
+def pack_thermals(rows: List[Dict[str, Any]], default_net: float = 1.8) -> ThermalTable:
+    """Normalized records -> ThermalTable; rows without a position are dropped."""
+    rows = [r for r in rows if r.get("lat") is not None and r.get("lon") is not None]
+    n = len(rows)
+
+    def col(fn):
+        return np.fromiter((fn(r) for r in rows), float, count=n)
+
+    alt_base = col(lambda r: _num(r.get("alt_base_m")))
+    alt_top = col(lambda r: _num(r.get("alt_top_m")))
+    t0 = col(lambda r: r["_t_start_unix"] if r.get("_t_start_unix") is not None
+             else (_iso_to_unix(r["t_start"]) if r.get("t_start") else math.nan))
+    t1 = col(lambda r: r["_t_end_unix"] if r.get("_t_end_unix") is not None
+             else (_iso_to_unix(r["t_end"]) if r.get("t_end") else math.nan))
+
+    # Net climb from alt_top/base over the time window, clipped to 0.2..6 m/s;
+    # NaN anywhere (missing heights or times) falls back to the default
+    with np.errstate(invalid="ignore"):
+        net = np.clip((alt_top - alt_base) / np.maximum(1.0, t1 - t0), 0.2, 6.0)
+    net = np.where(np.isfinite(net), net, default_net)
+
+    lat, lon = col(lambda r: r["lat"]), col(lambda r: r["lon"])
+    return ThermalTable(
+        lat=lat, lon=lon,
+        alt_base=alt_base, alt_top=alt_top, t0=t0, t1=t1,
+        net_ms=net, ceiling=np.where(np.isnan(alt_top), alt_base + 1000.0, alt_top),
+        xyz=_unit_xyz(lat, lon),
+        t_start_text=np.array([r.get("t_start") for r in rows], dtype=object),
+        t_end_text=np.array([r.get("t_end") for r in rows], dtype=object),
+        alt_base_raw=np.array([r.get("alt_base_m") for r in rows], dtype=object),
+        alt_top_raw=np.array([r.get("alt_top_m") for r in rows], dtype=object),
+    )
 
-def corridor_filter(rows: List[Dict[str, Any]],
+def corridor_filter(thermals: ThermalTable,
                     start, goal,
                     corridor_km: float,
                     max_nodes: int,
-                    min_net: float) -> List[Dict[str, Any]]:
+                    min_net: float) -> ThermalTable:
     """Finite capsule corridor + quality filter."""
+    if not len(thermals):
+        return thermals
     a_lat, a_lon = start["lat"], start["lon"]
     b_lat, b_lon = goal["lat"], goal["lon"]
 
     corridor_m = corridor_km * 1000.0
     seg_len_m = haversine_m(a_lat, a_lon, b_lat, b_lon)
 
-    selected = []
-    for r in rows:
-        lat, lon = r.get("lat"), r.get("lon")
-        if lat is None or lon is None:
-            continue
-
-        # 1) Within corridor distance to great-circle
-        xtrack = cross_track_distance_m(lat, lon, a_lat, a_lon, b_lat, b_lon)
-        if xtrack > corridor_m:
-            continue
-
-        # 2) Also within finite capsule around the segment
-        da = haversine_m(a_lat, a_lon, lat, lon)
-        db = haversine_m(b_lat, b_lon, lat, lon)
-        if da > seg_len_m + corridor_m or db > seg_len_m + corridor_m:
-            continue
-
-        net = estimate_net_ms(r)
-        if net < min_net:
-            continue
-
-        r["_net_ms"] = float(net)
-        ceil = r.get("alt_top_m")
-        if ceil is None and r.get("alt_base_m") is not None:
-            ceil = float(r["alt_base_m"]) + 1000.0
-        r["_ceiling"] = float(ceil) if ceil is not None else None
+    # Cheap box test first; only thermals near the segment get the exact geometry
+    idx = None
+    if len(thermals) >= CORRIDOR_BOX_MIN_ROWS:
+        idx = _corridor_box(thermals.lat, thermals.lon, a_lat, a_lon, b_lat, b_lon, seg_len_m, corridor_m)
+    if idx is None:
+        idx = np.arange(len(thermals))
 
-        selected.append(r)
+    # Exact capsule + corridor geometry for the candidates, then the quality cut
+    idx, da = _corridor_select(thermals.xyz, thermals.lat, thermals.lon, idx,
+                               a_lat, a_lon, b_lat, b_lon, seg_len_m, corridor_m)
+    ok = thermals.net_ms[idx] >= min_net
+    idx, da = idx[ok], da[ok]
 
     # Sort: nearest to START first, then higher net — so T1 is the closest thermal
-    selected.sort(key=lambda r: (haversine_m(a_lat, a_lon, r["lat"], r["lon"]), -r["_net_ms"]))
+    idx = idx[np.lexsort((-thermals.net_ms[idx], da))]
 
-    if max_nodes and len(selected) > max_nodes:
-        selected = selected[:max_nodes]
-    return selected
+    if max_nodes and len(idx) > max_nodes:
+        idx = idx[:max_nodes]
+    return thermals.take(idx)
 
 def main():
     ap = argparse.ArgumentParser(description="Generate plan.json using live WeGlide thermals")
     ap.add_argument("--day", help="UTC day YYYY-MM-DD (default: today UTC)")
+    ap.add_argument("--cache-dir", help="Cache WeGlide responses here and revalidate them with "
+                                        "conditional GETs (WEGLIDE_CACHE_DIR env also accepted)")
     ap.add_argument("--start", required=True, nargs=3, metavar=("LAT","LON","H_MSL"),
                     type=float, help="Start lat lon heightMSL")
     ap.add_argument("--goal", required=True, nargs=3, metavar=("LAT","LON","ARRIVE_H"),
@@ -162,6 +327,8 @@ def main():
     ap.add_argument("--per-leg-floor", type=float, default=1200.0, help="Arrival floor required at end of each leg (MSL meters)")
     ap.add_argument("--chain-thermals", action="store_true",
                     help="If set, allow hops between thermals (multi-stop). Default is single thermal then GOAL.")
+    ap.add_argument("--prune", action="store_true",
+                    help="Drop path thermals that can be bypassed by a direct glide at no time cost")
     ap.add_argument("--outfile", default="plan.json")
     # planner knobs
     ap.add_argument("--mc", type=float, default=0.0, help="MacCready (m/s)")
@@ -171,7 +338,7 @@ def main():
     args = ap.parse_args()
 
     ts = parse_day_to_unix(args.day)
-    wg = WeGlideClient()
+    wg = WeGlideClient(cache_dir=args.cache_dir)
     raw = wg.get_thermals(time_unix=ts)
     rows = []
     for it in raw:
@@ -179,28 +346,31 @@ def main():
         if rec: rows.append(rec)
 
     # --- Print all thermals fetched from WeGlide ---
-    # print(f"\nFetched {len(rows)} thermals from WeGlide for {args.day or 'today'}:")
-    # for i, r in enumerate(rows):
-    #     lat = r.get("lat")
-    #     lon = r.get("lon")
-    #     base = r.get("alt_base_m")
-    #     top = r.get("alt_top_m")
-    #     net = estimate_net_ms(r)
-    #     print(f"  {i+1:03d}: lat={lat:.4f}, lon={lon:.4f}, base={base}, top={top}, est_net={net:.2f} m/s")
+    # tab = pack_thermals(rows)  # net climb estimates live in tab.net_ms
+    # print(f"\nFetched {len(tab)} thermals from WeGlide for {args.day or 'today'}:")
+    # for i in range(len(tab)):
+    #     print(f"  {i+1:03d}: lat={tab.lat[i]:.4f}, lon={tab.lon[i]:.4f}, base={tab.alt_base[i]}, "
+    #           f"top={tab.alt_top[i]}, est_net={tab.net_ms[i]:.2f} m/s")
     # print()
 
     start = {"lat": args.start[0], "lon": args.start[1], "h_msl": args.start[2]}
     goal  = {"lat": args.goal[0],  "lon": args.goal[1],  "h_req_msl": args.goal[2]}
 
-    sel = corridor_filter(rows, start, goal,
+    sel = corridor_filter(pack_thermals(rows), start, goal,
                           corridor_km=args.corridor_km,
                           max_nodes=args.max_nodes,
                           min_net=args.min_net)
 
+    # Per-thermal Python values are only materialized here, for printing and export
+    lat_l, lon_l, net_l = sel.lat.tolist(), sel.lon.tolist(), sel.net_ms.tolist()
+    ceil_l = [None if math.isnan(c) else c for c in sel.ceiling.tolist()]
+    base_l, top_l = sel.alt_base_raw.tolist(), sel.alt_top_raw.tolist()
+    t_start_l, t_end_l = sel.iso_times()
+
     # --- Print selected thermals after corridor filtering ---
     print(f"Selected {len(sel)} thermals inside {args.corridor_km:.1f} km corridor (min_net={args.min_net} m/s):")
-    for i, r in enumerate(sel):
-        print(f"  {i+1:03d}: lat={r['lat']:.4f}, lon={r['lon']:.4f}, net={r['_net_ms']:.2f} m/s, ceiling={r.get('_ceiling')}")
+    for i in range(len(sel)):
+        print(f"  {i+1:03d}: lat={lat_l[i]:.4f}, lon={lon_l[i]:.4f}, net={net_l[i]:.2f} m/s, ceiling={ceil_l[i]}")
     print()
 
     # --- Build nodes once (START + thermals + GOAL) and a parallel export for the visualiser
@@ -208,33 +378,50 @@ def main():
     nodes_list.append(Node("START", start["lat"], start["lon"], thermal_net_ms=0.0, ceiling_msl=None))
 
     thermals_export = []
-    for idx, r in enumerate(sel, start=1):
-        nid = f"T{idx}"
-        nodes_list.append(Node(nid, r["lat"], r["lon"],
-                               thermal_net_ms=float(r["_net_ms"]),
-                               ceiling_msl=r.get("_ceiling")))
+    for i in range(len(sel)):
+        nid = f"T{i + 1}"
+        nodes_list.append(Node(nid, lat_l[i], lon_l[i],
+                               thermal_net_ms=net_l[i],
+                               ceiling_msl=ceil_l[i]))
         thermals_export.append({
             "id": nid,
-            "lat": r["lat"],
-            "lon": r["lon"],
-            "net_ms": float(r["_net_ms"]),
-            "ceiling_msl": r.get("_ceiling"),
-            "alt_base_m": r.get("alt_base_m"),
-            "alt_top_m": r.get("alt_top_m"),
-            "t_start": r.get("t_start"),
-            "t_end": r.get("t_end"),
+            "lat": lat_l[i],
+            "lon": lon_l[i],
+            "net_ms": net_l[i],
+            "ceiling_msl": ceil_l[i],
+            "alt_base_m": base_l[i],
+            "alt_top_m": top_l[i],
+            "t_start": t_start_l[i],
+            "t_end": t_end_l[i],
             "used_in_path": False,  # will be updated after solving
         })
 
     nodes_list.append(Node("GOAL", goal["lat"], goal["lon"], thermal_net_ms=0.0, ceiling_msl=None))
 
     # --- Build edges so thermals are actually usable ---
+    # Integer CSR over nodes_list order (START=0, T1..Tn=1..n, GOAL=n+1) for the
+    # planner; the string-keyed dict is only kept for the JSON export.
+    n_th = len(sel)
+    goal_ix = n_th + 1
+    th_ix = np.arange(1, n_th + 1, dtype=np.int64)
+    if args.chain_thermals:
+        # row k: every other thermal, then GOAL
+        others = np.broadcast_to(th_ix, (n_th, n_th))[~np.eye(n_th, dtype=bool)].reshape(n_th, max(n_th - 1, 0))
+        th_rows = np.hstack([others, np.full((n_th, 1), goal_ix, dtype=np.int64)])
+    else:
+        th_rows = np.full((n_th, 1), goal_ix, dtype=np.int64)
+    csr_indices = np.concatenate([th_ix, [goal_ix], th_rows.ravel()]).astype(np.int64)
+    row_len = np.concatenate([[n_th + 1], np.full(n_th, th_rows.shape[1]), [0]])
+    csr_indptr = np.concatenate([[0], np.cumsum(row_len)]).astype(np.int64)
+
     thermal_ids = [n.id for n in nodes_list if n.id not in ("START", "GOAL")]
     edges: Dict[str, List[str]] = {"GOAL": []}
     edges["START"] = thermal_ids + ["GOAL"]  # allow direct, plus via any thermal
     if args.chain_thermals:
-        for i in thermal_ids:
-            edges[i] = [j for j in thermal_ids if j != i] + ["GOAL"]
+        # every other thermal, by slicing around i's position rather than filtering
+        all_ids = tuple(thermal_ids)
+        for k, i in enumerate(all_ids):
+            edges[i] = [*all_ids[:k], *all_ids[k + 1:], "GOAL"]
     else:
         for i in thermal_ids:
             edges[i] = ["GOAL"]
@@ -245,17 +432,31 @@ def main():
 
     # --- Run A*
     nodes_dict = {n.id: n for n in nodes_list}
-    plan_obj = astar_best_path(
-        nodes=nodes_dict,
-        edges=edges,
-        start_id="START",
-        goal_id="GOAL",
-        start_h_msl=start["h_msl"],
-        arrival_floor_each_leg_msl=args.per_leg_floor,
-        polar=polar,
-        met=met,
-        mc_value_ms=args.mc,
-    )
+    # With no thermals the direct leg is the only candidate route; with START on
+    # top of GOAL and height in hand the zero-length direct leg wins outright.
+    # Either way fly it once instead of searching (thermals are still exported).
+    plan_obj = None
+    if not len(sel) or (haversine_m(start["lat"], start["lon"], goal["lat"], goal["lon"]) < 1.0
+                        and start["h_msl"] >= args.per_leg_floor):
+        plan_obj = evaluate_path(["START", "GOAL"], nodes_dict, start["h_msl"], args.per_leg_floor,
+                                 polar, met, args.mc)
+        if plan_obj is None and not len(sel):
+            raise RuntimeError("No feasible route to goal with given thermals and constraints.")
+    if plan_obj is None:
+        plan_obj = astar_best_path(
+            nodes=nodes_dict,
+            edge_csr=(csr_indptr, csr_indices),
+            start_id="START",
+            goal_id="GOAL",
+            start_h_msl=start["h_msl"],
+            arrival_floor_each_leg_msl=args.per_leg_floor,
+            polar=polar,
+            met=met,
+            mc_value_ms=args.mc,
+        )
+
+    if args.prune:
+        plan_obj = prune_path(plan_obj, nodes_dict, polar, met, args.mc, args.per_leg_floor, start["h_msl"])
 
     # Mark used thermals for styling on the map
     used_ids = set(plan_obj.path) - {"START", "GOAL"}
@@ -263,14 +464,13 @@ def main():
         if t["id"] in used_ids:
             t["used_in_path"] = True
 
-    # --- Nodes JSON for front-end (includes ALL thermals, not just path)
-    nodes_json = {
-        n.id: {"lat": n.lat, "lon": n.lon, "thermal_net_ms": n.thermal_net_ms, "ceiling_msl": n.ceiling_msl}
-        for n in nodes_list
-    }
-
-    # --- Build per-node pins with altitudes and labels
-    pins: Dict[str, Dict[str, Any]] = {n.id: {"lat": n.lat, "lon": n.lon} for n in nodes_list}
+    # --- Nodes JSON for front-end (includes ALL thermals, not just path) and
+    # per-node pins with altitudes and labels, built in one pass over the nodes
+    nodes_json: Dict[str, Dict[str, Any]] = {}
+    pins: Dict[str, Dict[str, Any]] = {}
+    for n in nodes_list:
+        nodes_json[n.id] = {"lat": n.lat, "lon": n.lon, "thermal_net_ms": n.thermal_net_ms, "ceiling_msl": n.ceiling_msl}
+        pins[n.id] = {"lat": n.lat, "lon": n.lon}
     pins["START"]["start_h_msl"] = round(start["h_msl"])
     for s in plan_obj.steps:
         pins[s.from_id]["depart_h_msl"] = round(s.depart_h_msl)
@@ -295,7 +495,7 @@ def main():
         "path": plan_obj.path,
         "total_time_s": plan_obj.total_time_s,
         "final_arrival_h_msl": plan_obj.final_arrival_h_msl,
-        "steps": [s.__dict__ for s in plan_obj.steps],
+        "steps": plan_obj.steps,
         "nodes": nodes_json,         # ALL nodes incl. T1..Tk, not just path
         "edges": edges,
         "thermals": thermals_export, # ALL corridor thermals with used_in_path flag
@@ -320,8 +520,7 @@ def main():
     for nid in plan["path"]:
         print(pin_labels.get(nid, nid))
 
-    with open(args.outfile, "w", encoding="utf-8") as f:
-        json.dump(plan, f, indent=2)
+    write_json(args.outfile, plan)
     print(f"Wrote {args.outfile} with path: {' -> '.join(plan_obj.path)}")
 
     # Human-readable step breakdown
@@ -1,7 +1,14 @@
 # get_thermal.py
 from weglide_client import WeGlideClient
 from datetime import datetime, timezone
-import argparse, json, csv
+import argparse, json, math, os
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # optional: GeoJSON is written with the stdlib json module
+    orjson = None
 
 def utc_midnight_ts(day_str: str | None) -> int:
     if day_str:
@@ -14,30 +21,85 @@ def utc_midnight_ts(day_str: str | None) -> int:
 
 def to_iso(ts) -> str | None:
     try:
-        return datetime.utcfromtimestamp(float(ts)).replace(tzinfo=timezone.utc).isoformat()
+        # timezone-aware replacement for deprecated utcfromtimestamp
+        return datetime.fromtimestamp(float(ts), tz=timezone.utc).isoformat()
     except Exception:
         return None
 
-def normalize_item(item):
+# Range of datetime (years 1..9999) in Unix seconds; to_iso gives None outside it
+_ISO_MIN_TS, _ISO_MAX_TS = -62135596800.0, 253402300800.0
+
+def _as_float(v) -> float:
+    try:
+        return float(v)
+    except Exception:
+        return float("nan")
+
+def iso_many(values) -> list:
+    """
+    to_iso over a sequence in one NumPy pass. Whole-second timestamps (the
+    WeGlide norm) are formatted by datetime_as_string; anything else goes
+    through to_iso, so every entry matches to_iso exactly.
+    """
+    ts = np.array([_as_float(v) for v in values], dtype=float)
+    out = [None] * len(ts)
+    with np.errstate(invalid="ignore"):
+        whole = (ts == np.floor(ts)) & (ts >= _ISO_MIN_TS) & (ts < _ISO_MAX_TS)
+    idx = np.flatnonzero(whole)
+    text = np.datetime_as_string(ts[idx].astype(np.int64).astype("datetime64[s]"), unit="s")
+    for i, t in zip(idx.tolist(), text.tolist()):
+        out[i] = t + "+00:00"
+    for i in np.flatnonzero(~whole & np.isfinite(ts)).tolist():
+        out[i] = to_iso(ts[i])
+    return out
+
+# Map tiles: cells per degree (~10 km), so the page only draws the points in view
+TILE_PER_DEG = 10
+
+def tile_key(lat: float, lon: float, per_deg: int = TILE_PER_DEG) -> str | None:
+    """'row/col' index of the 1/per_deg-degree cell holding (lat, lon); None off the map."""
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    return f"{math.floor(lat * per_deg)}/{math.floor(lon * per_deg)}"
+
+def group_by_tile(pts, per_deg: int = TILE_PER_DEG) -> dict:
+    """Map tile key -> points, so a region lookup is a dict hit per cell instead of a scan."""
+    out = {}
+    for p in pts:
+        key = tile_key(p["lat"], p["lon"], per_deg)
+        if key is not None:
+            out.setdefault(key, []).append(p)
+    return out
+
+def normalize_item(item, times=None):
     """
     Handle both array payloads and dict payloads.
     Array shape (observed):
       [ id, lon, lat, alt_base_m, alt_top_m, t_start_unix, t_end_unix ]
+    times: optional preformatted (t_start, t_end), as normalize_items passes in.
     """
     # Array case
     if isinstance(item, (list, tuple)) and len(item) >= 3:
-        lon = float(item[1]); lat = float(item[2])
-        rec = {
-            "lat": lat,
-            "lon": lon,
-        }
-        if len(item) >= 4: rec["alt_base_m"] = item[3]
-        if len(item) >= 5: rec["alt_top_m"]  = item[4]
-        if len(item) >= 6: rec["t_start"]    = to_iso(item[5])
-        if len(item) >= 7: rec["t_end"]      = to_iso(item[6])
-        # optional id
-        try: rec["id"] = int(item[0])
-        except Exception: pass
+        n = len(item)
+        if times is None:
+            times = (to_iso(item[5]) if n >= 6 else None, to_iso(item[6]) if n >= 7 else None)
+        if n >= 7:
+            # full row (the norm): one dict literal, no per-field length checks
+            rec = {"lat": float(item[2]), "lon": float(item[1]),
+                   "alt_base_m": item[3], "alt_top_m": item[4],
+                   "t_start": times[0], "t_end": times[1]}
+        else:
+            rec = {"lat": float(item[2]), "lon": float(item[1])}
+            if n >= 4: rec["alt_base_m"] = item[3]
+            if n >= 5: rec["alt_top_m"]  = item[4]
+            if n >= 6: rec["t_start"]    = times[0]
+        # optional id; ints (the norm) skip the conversion and its try
+        i0 = item[0]
+        if type(i0) is int:
+            rec["id"] = i0
+        else:
+            try: rec["id"] = int(i0)
+            except Exception: pass
         return rec
 
     # Dict fallback (if Weglide changes format / some days differ)
@@ -50,40 +112,60 @@ def normalize_item(item):
 
     return None
 
+def normalize_items(items):
+    """normalize_item over a payload; the timestamps of all array items are formatted in one batch."""
+    def col(i):
+        return [it[i] if isinstance(it, (list, tuple)) and len(it) > i else None for it in items]
+    starts, ends = iso_many(col(5)), iso_many(col(6))
+    rows = []
+    for item, t_start, t_end in zip(items, starts, ends):
+        rec = normalize_item(item, times=(t_start, t_end))
+        if rec: rows.append(rec)
+    return rows
+
 def write_csv(rows, path="thermals.csv"):
     fields = ["lat","lon","alt_base_m","alt_top_m","t_start","t_end","id"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
-        for r in rows:
-            w.writerow({k: r.get(k, "") for k in fields})
+    # Object columns keep each value's own str() (ints stay ints); missing/None
+    # cells are "" and NaN is "nan", with csv's \r\n line ends, as DictWriter wrote
+    df = pd.DataFrame({k: pd.Series(["" if (v := r.get(k)) is None else v for r in rows], dtype=object)
+                       for k in fields})
+    df.to_csv(path, index=False, na_rep="nan", lineterminator="\r\n", encoding="utf-8")
+
+def _props(r):
+    props = r.copy()
+    props.pop("lat", None); props.pop("lon", None)
+    return props
 
 def write_geojson(rows, path="thermals.geojson"):
-    fc = {"type": "FeatureCollection", "features": []}
-    for r in rows:
-        lat, lon = r.get("lat"), r.get("lon")
-        if lat is None or lon is None: continue
-        props = {k: v for k, v in r.items() if k not in ("lat","lon")}
-        fc["features"].append({
-            "type":"Feature",
-            "geometry":{"type":"Point","coordinates":[lon,lat]},
-            "properties":props
-        })
+    features = [{"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": [r["lon"], r["lat"]]},
+                 "properties": _props(r)}
+                for r in rows if r.get("lat") is not None and r.get("lon") is not None]
+    fc = {"type": "FeatureCollection", "features": features}
+    if orjson is not None:
+        # compact C encoding in one call (NaN is written as null)
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(fc))
+        return
     with open(path, "w", encoding="utf-8") as f:
         json.dump(fc, f, ensure_ascii=False)
 
-def write_leaflet(rows, path="thermals_map.html"):
-    pts = []
-    for r in rows:
-        if r.get("lat") is None or r.get("lon") is None: continue
-        label = f"alt {r.get('alt_base_m','?')}→{r.get('alt_top_m','?')} m\\n{r.get('t_start','?')}–{r.get('t_end','?')}"
-        pts.append({"lat":r["lat"], "lon":r["lon"], "label":label})
-    if pts:
-        c = pts[len(pts)//2]
-        center_lat, center_lon = c["lat"], c["lon"]
-    else:
-        center_lat, center_lon = 51.0, 0.0
-    js = json.dumps(pts)
+def write_leaflet(rows, path="thermals_map.html", points_name="thermals_points.js"):
+    """
+    The map page is static; the points go to a separate script next to it
+    (points_name), so the HTML stays ~1 KB whatever the count and a rerun only
+    rewrites the data. A <script src> rather than fetch() keeps the page
+    working when opened straight from disk (file://). Points are grouped by
+    tile and each tile's markers are added once it first comes into view.
+    """
+    pts = [{"lat": r["lat"], "lon": r["lon"],
+            "label": f"alt {r.get('alt_base_m','?')}→{r.get('alt_top_m','?')} m\\n{r.get('t_start','?')}–{r.get('t_end','?')}"}
+           for r in rows if r.get("lat") is not None and r.get("lon") is not None]
+    data = {"per_deg": TILE_PER_DEG, "center": pts[len(pts) // 2] if pts else None,
+            "tiles": group_by_tile(pts)}
+    js = orjson.dumps(data).decode() if orjson is not None else json.dumps(data)
+    with open(os.path.join(os.path.dirname(path), points_name), "w", encoding="utf-8") as f:
+        f.write(f"const THERMAL_POINTS = {js};\n")
     html = f"""<!doctype html>
 <html>
 <head>
@@ -92,46 +174,56 @@ def write_leaflet(rows, path="thermals_map.html"):
   <title>Thermals Map</title>
   <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
   <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+  <script src="{points_name}"></script>
   <style>html,body,#map{{height:100%;margin:0}}</style>
 </head>
 <body>
 <div id="map"></div>
 <script>
-const map = L.map('map').setView([{center_lat}, {center_lon}], 7);
+const {{per_deg: perDeg, center, tiles}} = THERMAL_POINTS;
+const c = center || {{lat: 51.0, lon: 0.0}};
+const map = L.map('map').setView([c.lat, c.lon], 7);
 L.tileLayer('https://tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
   maxZoom: 12, attribution: '&copy; OpenStreetMap'
 }}).addTo(map);
-const pts = {js};
-for (const p of pts) {{
-  L.circleMarker([p.lat, p.lon]).addTo(map).bindPopup(p.label);
+const pending = new Set(Object.keys(tiles));
+function showVisibleTiles() {{
+  const view = map.getBounds().pad(0.1);
+  for (const key of pending) {{
+    const [row, col] = key.split('/').map(Number);
+    if (!view.intersects([[row / perDeg, col / perDeg], [(row + 1) / perDeg, (col + 1) / perDeg]])) continue;
+    L.layerGroup(tiles[key].map(p => L.circleMarker([p.lat, p.lon]).bindPopup(p.label))).addTo(map);
+    pending.delete(key);
+  }}
 }}
+map.on('moveend', showVisibleTiles);
+showVisibleTiles();
 </script>
 </body>
-</html>""".replace("{center_lat}", str(center_lat)).replace("{center_lon}", str(center_lon))
+</html>"""
     with open(path, "w", encoding="utf-8") as f:
         f.write(html)
 
 def main():
     ap = argparse.ArgumentParser(description="Fetch WeGlide thermals and export CSV/GeoJSON/HTML map")
     ap.add_argument("--day", help="UTC day YYYY-MM-DD (default: today UTC)")
+    ap.add_argument("--cache-dir", help="Cache WeGlide responses here and revalidate them with "
+                                        "conditional GETs (WEGLIDE_CACHE_DIR env also accepted)")
     args = ap.parse_args()
 
     ts = utc_midnight_ts(args.day)
-    wg = WeGlideClient()
+    wg = WeGlideClient(cache_dir=args.cache_dir)
     thermals = wg.get_thermals(time_unix=ts)
     if not isinstance(thermals, list):
         thermals = [thermals]
 
-    rows = []
-    for item in thermals:
-        rec = normalize_item(item)
-        if rec: rows.append(rec)
+    rows = normalize_items(thermals)
 
     write_csv(rows)
     write_geojson(rows)
     write_leaflet(rows)
 
-    print(f"Wrote {len(rows)} thermal points → thermals.csv, thermals.geojson, thermals_map.html")
+    print(f"Wrote {len(rows)} thermal points → thermals.csv, thermals.geojson, thermals_map.html (+ thermals_points.js)")
     print("RAW SAMPLE:", json.dumps(thermals[:2], indent=2))
 
 if __name__ == "__main__":
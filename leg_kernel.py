@@ -0,0 +1,199 @@
+"""
+leg_kernel.py — compiled inner loop for generate.simulate_leg_and_requirements
+
+The kernel takes only primitive floats (no Polar / MetProvider objects) so
+Numba can compile it to a tight loop with all state in registers. Leg
+distance and track, and the cruise IAS and its sink rate, are computed once
+by the caller. wind_along_track_ms is inlined by hand and must be kept in
+sync with generate.py; isa_density_approx is served from a lookup table.
+
+Numba is optional: without it sim_leg_geom runs as plain Python and the batch
+kernel falls back to a NumPy solve over all edges and steps at once.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # optional accelerator; run the kernels as plain Python / NumPy
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+RHO0 = 1.225  # kg/m^3 at sea level, ISA
+
+# ISA troposphere constants (see generate.isa_density_approx)
+ISA_T0 = 288.15
+ISA_L = 0.0065
+ISA_G0 = 9.80665
+ISA_R = 287.05
+ISA_P0 = 101325.0
+
+
+@njit(cache=True, fastmath=True)
+def isa_density_exact(h):
+    """generate.isa_density_approx: ISA troposphere density at h metres."""
+    T = max(180.0, ISA_T0 - ISA_L*h)
+    p = ISA_P0 * (T/ISA_T0) ** (ISA_G0/(ISA_L*ISA_R))
+    return p / (ISA_R * T)
+
+
+# Density on a 50 m grid over 0..8000 m. Linear interpolation between entries is
+# within ~1e-5 relative of the formula and replaces its non-integer pow per step.
+ISA_LUT_STEP = 50.0
+ISA_LUT_H = np.arange(0.0, 8000.0 + ISA_LUT_STEP, ISA_LUT_STEP)
+ISA_LUT_RHO = np.array([isa_density_exact(h) for h in ISA_LUT_H])
+
+
+@njit(cache=True, fastmath=True)
+def isa_density(h):
+    """ISA density from the lookup table; the exact formula outside its range."""
+    x = h / ISA_LUT_STEP
+    if x >= 0.0 and x < ISA_LUT_RHO.shape[0] - 1:
+        i = int(x)
+        return ISA_LUT_RHO[i] + (x - i) * (ISA_LUT_RHO[i + 1] - ISA_LUT_RHO[i])
+    return isa_density_exact(h)
+
+
+def isa_density_vec(h):
+    """isa_density over an array (NumPy fallback path)."""
+    rho = np.interp(h, ISA_LUT_H, ISA_LUT_RHO)
+    outside = (h < 0.0) | (h > ISA_LUT_H[-1])
+    if outside.any():
+        T = np.maximum(180.0, ISA_T0 - ISA_L*h[outside])
+        rho[outside] = ISA_P0 * (T/ISA_T0) ** (ISA_G0/(ISA_L*ISA_R)) / (ISA_R * T)
+    return rho
+
+
+@njit(cache=True, fastmath=True)
+def sim_leg_geom(start_h, total_D, track, arrival_floor,
+                 V_ias, sink, ws, wdir, wair, step_m):
+    """
+    Integrate one leg of precomputed length/track under spatially uniform wind / w_air.
+    Met does not depend on position, so the position along the leg is never stepped.
+    Returns (required_start_h_msl, expected_arrival_h_msl, travel_time_s, distance_m).
+    """
+    n_steps = max(1, int(math.ceil(total_D / step_m)))
+    ds = total_D / n_steps
+
+    # Constant along the leg: sink at the (fixed) cruise IAS and the along-track wind
+    dh_dt = wair - sink
+    blow_to_deg = (wdir + 180.0) % 360.0
+    w_along = ws * math.cos(math.radians((blow_to_deg - track + 540.0) % 360.0 - 180.0))
+
+    h = start_h
+    t_s = 0.0
+    for _ in range(n_steps):
+        rho = isa_density(h)
+        V_tas = V_ias * math.sqrt(RHO0 / max(0.3, rho))
+        Vg_parallel = max(0.1, V_tas + w_along)
+
+        dt = ds / Vg_parallel
+        h += dh_dt * dt
+        t_s += dt
+
+    required_start = start_h + (arrival_floor - h)
+    return required_start, h, t_s, total_D
+
+
+def _sim_legs_numpy(start_h, dists, tracks, arrival_floor,
+                    V_ias, sink, ws, wdir, wair, step_m):
+    """
+    sim_legs_batch without numba: a NumPy solve over a (k edges, n steps) array,
+    with no Python loop over steps. Height at each step start is solved by
+    fixed-point iteration: density from the current height profile -> step
+    times -> prefix sum of height changes. The system is triangular, so it
+    settles on exactly the sequential sim_leg_geom result (within n
+    iterations, in practice a few). Defined even with numba installed, so the
+    two paths can be compared.
+    """
+    total_D = np.asarray(dists, dtype=float)
+    track = np.asarray(tracks, dtype=float)
+    k = total_D.shape[0]
+
+    n_steps = np.maximum(1, np.ceil(total_D / step_m).astype(np.int64))
+    ds = total_D / n_steps
+
+    dh_dt = wair - sink
+    blow_to_deg = (wdir + 180.0) % 360.0
+    w_along = ws * np.cos(np.radians((blow_to_deg - track + 540.0) % 360.0 - 180.0))
+
+    m = int(n_steps.max(initial=0))
+    # Step length per (edge, step); zero past an edge's last step so padding adds nothing
+    ds_live = np.where(np.arange(m) < n_steps[:, None], ds[:, None], 0.0)
+
+    # h_prof[:, i] is the height at the start of step i; column n is the arrival
+    h_prof = np.full((k, m + 1), float(start_h))
+    incr = np.empty((k, m + 1))
+    incr[:, 0] = start_h
+    for _ in range(m + 1):
+        h = h_prof[:, :m]
+        rho = isa_density_vec(h)
+        V_tas = V_ias * np.sqrt(RHO0 / np.maximum(0.3, rho))
+        Vg_parallel = np.maximum(0.1, V_tas + w_along[:, None])
+        dt = ds_live / Vg_parallel
+        incr[:, 1:] = dh_dt * dt
+        # cumsum seeded with start_h adds in the same order as the stepwise loop
+        h_next = np.cumsum(incr, axis=1)
+        if np.array_equal(h_next, h_prof):
+            break
+        h_prof = h_next
+
+    h_end = h_prof[:, m]
+    t_s = np.cumsum(dt, axis=1)[:, -1] if m else np.zeros(k)
+    required = start_h + (arrival_floor - h_end)
+    return required, h_end, t_s, total_D
+
+
+# Total integration steps in a batch below which starting worker threads costs
+# more than it saves; smaller batches stay on the serial loop.
+PARALLEL_MIN_STEPS = 4000
+
+if HAVE_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _sim_legs_serial(start_h, dists, tracks, arrival_floor,
+                         V_ias, sink, ws, wdir, wair, step_m):
+        k = dists.shape[0]
+        required = np.empty(k)
+        arrival = np.empty(k)
+        travel = np.empty(k)
+        dist = np.empty(k)
+        for j in range(k):
+            required[j], arrival[j], travel[j], dist[j] = sim_leg_geom(
+                start_h, dists[j], tracks[j], arrival_floor,
+                V_ias, sink, ws, wdir, wair, step_m)
+        return required, arrival, travel, dist
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _sim_legs_parallel(start_h, dists, tracks, arrival_floor,
+                           V_ias, sink, ws, wdir, wair, step_m):
+        k = dists.shape[0]
+        required = np.empty(k)
+        arrival = np.empty(k)
+        travel = np.empty(k)
+        dist = np.empty(k)
+        for j in prange(k):
+            required[j], arrival[j], travel[j], dist[j] = sim_leg_geom(
+                start_h, dists[j], tracks[j], arrival_floor,
+                V_ias, sink, ws, wdir, wair, step_m)
+        return required, arrival, travel, dist
+
+    def sim_legs_batch(start_h, dists, tracks, arrival_floor,
+                       V_ias, sink, ws, wdir, wair, step_m):
+        """
+        sim_leg_geom for every outgoing edge of one node in a single compiled call,
+        spread over threads (prange) when the batch is big enough to pay for them.
+        Returns four arrays (required, arrival, travel_time, distance) of len(dists).
+        """
+        kernel = _sim_legs_serial
+        if dists.shape[0] > 1 and dists.sum() / step_m >= PARALLEL_MIN_STEPS:
+            kernel = _sim_legs_parallel
+        return kernel(start_h, dists, tracks, arrival_floor, V_ias, sink, ws, wdir, wair, step_m)
+else:
+    sim_legs_batch = _sim_legs_numpy
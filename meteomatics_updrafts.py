@@ -9,8 +9,9 @@ Writes src/data/updrafts.json with:
   - top[level]    -> top-N strongest ascent cells
 
 FEATURE: If a bbox (areal) request returns 400 (free tier usually disallows areal),
-we automatically fall back to a point-scan: iterate grid points and query one location
-per request (free tier allows single-location queries).
+we automatically fall back to a point-scan: iterate grid points, several locations per
+request (--batch-size), or one location per request if the tier rejects multi-point
+queries (free tier allows single-location queries).
 
 Usage:
   python meteomatics_updrafts.py --time 2025-07-15T12:00:00Z \
@@ -20,15 +21,65 @@ Usage:
 
 Env auth:
   METEOMATICS_USER, METEOMATICS_PASS
+
+Responses come gzip/deflate-compressed by default; installing brotli / zstandard
+lets requests negotiate br / zstd as well.
 """
 
 from __future__ import annotations
-import argparse, csv, io, json, os, sys, time, math
-from typing import List, Dict, Any, Tuple
+import argparse, hashlib, io, json, os, re, sys, time, math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional: the output is written with the stdlib json module
+    orjson = None
 
 API_BASE = "https://api.meteomatics.com"
 
+# Whether an account may make areal requests is remembered per user for a day,
+# so free-tier runs skip the areal attempt that is bound to fail
+TIER_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "meteomatics")
+TIER_CACHE_TTL_S = 24 * 3600
+
+def _tier_cache_path(user: str) -> str:
+    return os.path.join(TIER_CACHE_DIR, hashlib.sha1(user.encode("utf-8")).hexdigest() + ".json")
+
+def areal_known_unsupported(user: str) -> bool:
+    """True if a recent run saw this user's areal request rejected."""
+    try:
+        with open(_tier_cache_path(user), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        return info.get("areal") is False and time.time() - float(info.get("checked", 0)) < TIER_CACHE_TTL_S
+    except (OSError, ValueError, TypeError):
+        return False
+
+# A 400 counts as "areal not allowed" only when the message is about the areal /
+# grid query; a bad time, model or parameter also answers 400
+_AREAL_REJECTION = re.compile(r"\b(areal|area|grid|bbox|bounding box)\b", re.IGNORECASE)
+
+def areal_rejected(r: requests.Response) -> bool:
+    try:
+        text = r.text
+    except Exception:
+        return False
+    return r.status_code == 400 and bool(_AREAL_REJECTION.search(text or ""))
+
+def remember_areal(user: str, supported: bool) -> None:
+    try:
+        os.makedirs(TIER_CACHE_DIR, exist_ok=True)
+        with open(_tier_cache_path(user), "w", encoding="utf-8") as f:
+            json.dump({"areal": supported, "checked": time.time()}, f)
+    except OSError:
+        pass  # cache is best-effort
+
 def parse_bbox(s: str) -> Tuple[float, float, float, float]:
     """
     Parse 'N,W S,E' (space between corners; comma between lat,lon).
@@ -48,74 +99,112 @@ def build_grid_location(n: float, w: float, s_: float, e: float, step_deg: float
     """
     return f"{n:.6f},{w:.6f}_{s_:.6f},{e:.6f}:{step_deg}x{step_deg}"
 
+@lru_cache(maxsize=None)
 def level_param(level_hpa: int) -> str:
     # Vertical wind (omega) at a pressure level, in Pascal per second
     return f"wind_speed_w_{level_hpa}hPa:Pas"
 
+def make_session(pool_maxsize: int = 1) -> requests.Session:
+    """
+    Keep-alive session for the run: every request goes to the same host, so
+    connections (and their TLS handshakes) are reused. Transient 502/503/504
+    responses are retried with backoff.
+    """
+    session = requests.Session()
+    session.headers.update({"Accept": "text/csv"})
+    session.mount("https://", HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max(1, pool_maxsize),
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+    ))
+    return session
+
 def fetch_csv_areal(time_iso: str, params: List[str], location: str, auth: Tuple[str, str],
-                    model: str = "mix", timeout: int = 60) -> requests.Response:
+                    model: str = "mix", timeout: int = 60,
+                    session: Optional[requests.Session] = None) -> requests.Response:
     url = f"{API_BASE}/{time_iso}/" + ",".join(params) + f"/{location}/csv?model={model}"
-    r = requests.get(url, auth=auth, timeout=timeout)
+    r = (session or requests).get(url, auth=auth, timeout=timeout)
     return r
 
-def fetch_csv_point(time_iso: str, params: List[str], lat: float, lon: float, auth: Tuple[str, str],
-                    model: str = "mix", timeout: int = 60) -> requests.Response:
-    # one location (lat,lon) only
-    url = f"{API_BASE}/{time_iso}/" + ",".join(params) + f"/{lat:.6f},{lon:.6f}/csv?model={model}"
-    r = requests.get(url, auth=auth, timeout=timeout)
+def csv_url_affixes(time_iso: str, params: List[str], model: str = "mix") -> Tuple[str, str]:
+    """URL text before and after the location part, fixed for a whole point-scan."""
+    return f"{API_BASE}/{time_iso}/" + ",".join(params) + "/", f"/csv?model={model}"
+
+CSV_COLUMNS = ["validdate", "parameter", "lat", "lon", "value"]
+
+def fetch_csv_points(time_iso: str, params: List[str], pts: np.ndarray, auth: Tuple[str, str],
+                     model: str = "mix", timeout: int = 60,
+                     session: Optional[requests.Session] = None,
+                     affixes: Optional[Tuple[str, str]] = None) -> requests.Response:
+    # several locations in one request: lat1,lon1+lat2,lon2+...
+    # affixes: csv_url_affixes(...) built once by the caller, or None to build here
+    prefix, suffix = affixes or csv_url_affixes(time_iso, params, model)
+    flat = np.asarray(pts, dtype=float).reshape(-1).tolist()
+    url = prefix + ("%.6f,%.6f+" * (len(flat) // 2) % tuple(flat))[:-1] + suffix
+    r = (session or requests).get(url, auth=auth, timeout=timeout)
     return r
 
-def parse_csv_rows(csv_text: str) -> List[Dict[str, Any]]:
+def parse_csv_rows(csv_text: str) -> pd.DataFrame:
     """
     Meteomatics CSV uses ';' separator and columns: validdate;parameter;lat;lon;value
+    Parsed by pandas' C reader; unparseable numbers become NaN. Any of those
+    columns the body lacks (empty or other-format responses) is added as NaN.
     """
-    rows = list(csv.DictReader(io.StringIO(csv_text), delimiter=';'))
-    for r in rows:
+    try:
+        df = pd.read_csv(io.StringIO(csv_text), sep=';', engine='c', dtype={"parameter": str})
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=CSV_COLUMNS)
+    for c in CSV_COLUMNS:
+        if c not in df:
+            df[c] = np.nan
+    for c in ("lat", "lon", "value"):
         # normalize
-        try:
-            r["lat"] = float(r["lat"])
-            r["lon"] = float(r["lon"])
-            r["value"] = float(r["value"])
-        except Exception:
-            r["value"] = float("nan")
-    return rows
-
-def grid_points(n: float, w: float, s_: float, e: float, step: float, max_points: int | None) -> List[Tuple[float,float]]:
-    """Generate grid (lat,lon) points from bbox and step. Optionally limit to max_points."""
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+def grid_axis(start: float, stop: float, step: float) -> np.ndarray:
+    """
+    start, start±step, ... up to stop (1e-9 tolerance), plus stop itself when the
+    span is not a whole number of steps. Ticks are start + i*step, so rounding
+    does not accumulate into a near-duplicate of the edge.
+    """
+    span = abs(stop - start)
+    k = int(math.floor(span / step + 1e-9))
+    ticks = start + math.copysign(step, stop - start) * np.arange(k + 1)
+    if span - k * step > 1e-9:
+        # include exact edge
+        ticks = np.append(ticks, stop)
+    return ticks
+
+def grid_points(n: float, w: float, s_: float, e: float, step: float, max_points: int | None) -> np.ndarray:
+    """Generate grid (lat,lon) points from bbox and step as a (K,2) array. Optionally limit to max_points."""
     if step <= 0:
         raise ValueError("step must be > 0")
-    lats = []
-    lat = n
-    # go southward
-    while lat + 1e-9 >= s_:
-        lats.append(lat)
-        lat = lat - step
-        if lat < s_ and (n - s_) % step > 1e-9:
-            # include exact south edge
-            lats.append(s_)
-            break
-    lons = []
-    lon = w
-    while lon <= e + 1e-9:
-        lons.append(lon)
-        lon = lon + step
-        if lon > e and (e - w) % step > 1e-9:
-            lons.append(e)
-            break
-    pts = [(la, lo) for la in lats for lo in lons]
+    lats = grid_axis(n, s_, step)  # go southward
+    lons = grid_axis(w, e, step)
+    LA, LO = np.meshgrid(lats, lons, indexing="ij")
+    pts = np.column_stack([LA.ravel(), LO.ravel()])
     if max_points is not None and len(pts) > max_points:
         # simple thinning: take roughly uniform subset
         stride = math.ceil(len(pts) / max_points)
         pts = pts[::stride]
     return pts
 
-def build_output(rows: List[Dict[str, Any]], levels: List[int], top: int) -> Dict[str, Any]:
+def build_output(rows: pd.DataFrame, levels: List[int], top: int) -> Dict[str, Any]:
     out: Dict[str, Any] = {"levels": levels, "grids": {}, "top": {}}
+    lat = rows["lat"].to_numpy(dtype=float)
+    lon = rows["lon"].to_numpy(dtype=float)
+    val = rows["value"].to_numpy(dtype=float)
+    # Parameter names as small integer codes, factorized once: each level's
+    # filter is then an integer compare instead of a string compare per row
+    codes, names = pd.factorize(rows["parameter"])
+    code_of = {name: i for i, name in enumerate(names)}
     for lvl in levels:
-        p = level_param(lvl)
-        pts = [ {"lat": r["lat"], "lon": r["lon"], "value": r["value"]}
-                for r in rows if r.get("parameter") == p ]
-        pts_sorted = sorted(pts, key=lambda x: x["value"])  # most negative first
+        sel = np.flatnonzero(codes == code_of.get(level_param(lvl), -2))
+        # most negative first (NaN last); stable, so equal values keep response order
+        sel = sel[np.argsort(val[sel], kind="stable")]
+        pts_sorted = [{"lat": la, "lon": lo, "value": v}
+                      for la, lo, v in zip(lat[sel].tolist(), lon[sel].tolist(), val[sel].tolist())]
         out["grids"][str(lvl)] = pts_sorted
         out["top"][str(lvl)] = pts_sorted[:top] if top > 0 else []
     return out
@@ -133,7 +222,12 @@ def main():
     ap.add_argument("--password", help="Meteomatics password (fallback METEOMATICS_PASS env)")
     # point-scan controls
     ap.add_argument("--max-points", type=int, default=400, help="Max grid points to sample in point-scan fallback")
-    ap.add_argument("--sleep", type=float, default=0.0, help="Sleep seconds between point requests (free tier friendly)")
+    ap.add_argument("--sleep", type=float, default=0.0, help="Sleep seconds after each point request, per worker (free tier friendly)")
+    ap.add_argument("--batch-size", type=int, default=25,
+                    help="Points per point-scan request (one point each if the tier rejects multi-point)")
+    ap.add_argument("--recheck-areal", action="store_true",
+                    help="Try the areal request even if it was rejected as not allowed for this user in the last 24 h")
+    ap.add_argument("--concurrency", type=int, default=8, help="Point requests in flight at once during point-scan")
     args = ap.parse_args()
 
     user = args.user or os.getenv("METEOMATICS_USER")
@@ -146,41 +240,85 @@ def main():
     location = build_grid_location(n, w, s_, e, args.step)
     params = [level_param(lvl) for lvl in args.levels]
     auth = (user, password)
+    workers = max(1, args.concurrency)
+    session = make_session(pool_maxsize=workers)
 
     print(f"Requesting Meteomatics omega @ {args.time} | levels {args.levels} hPa")
     print(f"  bbox N={n}, W={w}, S={s_}, E={e}, step={args.step} | model={args.model}")
 
-    # Try AREAL request first
-    rows: List[Dict[str, Any]] = []
-    r = fetch_csv_areal(args.time, params, location, auth, model=args.model)
-    if r.ok:
-        rows = parse_csv_rows(r.text)
-        print(f"Areal OK: received {len(rows)} rows")
+    # Try AREAL request first, unless this account recently had it rejected
+    frames: List[pd.DataFrame] = []
+    r = None
+    if args.recheck_areal or not areal_known_unsupported(user):
+        r = fetch_csv_areal(args.time, params, location, auth, model=args.model, session=session)
+        if r.ok or areal_rejected(r):
+            remember_areal(user, r.ok)
+    areal_ok = r is not None and r.ok
+    if areal_ok:
+        frames.append(parse_csv_rows(r.text))
+        print(f"Areal OK: received {len(frames[0])} rows")
     else:
-        # If free tier, 400 is common for areal; print server message
-        try:
-            msg = r.text.strip()
-        except Exception:
-            msg = ""
-        print(f"Areal request failed: {r.status_code} {r.reason} — {msg[:200]}", file=sys.stderr)
-        print("Falling back to point-scan (single-location queries)...")
+        if r is None:
+            print("Areal requests were rejected for this user within 24 h; skipping (--recheck-areal to retry)")
+        else:
+            # If free tier, 400 is common for areal; print server message
+            try:
+                msg = r.text.strip()
+            except Exception:
+                msg = ""
+            print(f"Areal request failed: {r.status_code} {r.reason} — {msg[:200]}", file=sys.stderr)
+        print("Falling back to point-scan (point-location queries)...")
 
         pts = grid_points(n, w, s_, e, args.step, args.max_points)
         print(f"Point-scan over {len(pts)} points (max-points={args.max_points})")
-        for idx, (la, lo) in enumerate(pts, 1):
-            pr = fetch_csv_point(args.time, params, la, lo, auth, model=args.model)
+        # Latency dominates each request, so keep several in flight over the session
+        # and pack several points into each one
+        affixes = csv_url_affixes(args.time, params, args.model)
+
+        def fetch_batch(batch: np.ndarray) -> requests.Response:
+            pr = fetch_csv_points(args.time, params, batch, auth, model=args.model, session=session,
+                                  affixes=affixes)
+            if args.sleep > 0:
+                time.sleep(args.sleep)
+            return pr
+
+        def take(idx: int, batch: np.ndarray, pr: requests.Response) -> None:
             if pr.status_code == 401:
                 print("Unauthorized (401) — check Meteomatics credentials", file=sys.stderr)
                 sys.exit(3)
             if not pr.ok:
-                # skip this point, but log minimal info
-                print(f"  {idx:04d}/{len(pts)} {la:.3f},{lo:.3f} -> {pr.status_code} {pr.reason}", file=sys.stderr)
+                # skip this batch, but log minimal info
+                la, lo = batch[0]
+                more = f" (+{len(batch) - 1} pts)" if len(batch) > 1 else ""
+                print(f"  {idx:04d}/{len(pts)} {la:.3f},{lo:.3f}{more} -> {pr.status_code} {pr.reason}", file=sys.stderr)
             else:
-                rows.extend(parse_csv_rows(pr.text))
-            if args.sleep > 0:
-                time.sleep(args.sleep)
+                frames.append(parse_csv_rows(pr.text))
 
-        print(f"Point-scan collected {len(rows)} rows")
+        size = max(1, args.batch_size)
+        batches = [pts[i:i + size] for i in range(0, len(pts), size)]
+        first = None
+        if size > 1 and len(batches) > 0:
+            # Probe with the first batch; a tier without multi-point queries answers 400
+            first = fetch_batch(batches[0])
+            if first.status_code == 400:
+                print("Multi-point request rejected (400) — one point per request", file=sys.stderr)
+                batches, first = [pts[i:i + 1] for i in range(len(pts))], None
+        starts = np.cumsum([0] + [len(b) for b in batches]).tolist()
+        if first is not None:
+            take(1, batches[0], first)
+
+        # Responses are consumed in grid order, so rows and log lines match a serial scan
+        rest = batches[1:] if first is not None else batches
+        offset = len(batches) - len(rest)
+        with ThreadPoolExecutor(max_workers=min(workers, max(1, len(rest)))) as pool:
+            for k, pr in enumerate(pool.map(fetch_batch, rest), offset):
+                if pr.status_code == 401:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                take(starts[k] + 1, batches[k], pr)
+
+        print(f"Point-scan collected {sum(len(f) for f in frames)} rows")
+    session.close()
+    rows = pd.concat(frames, ignore_index=True) if frames else parse_csv_rows("")
 
     payload = {
         "meta": {
@@ -189,14 +327,19 @@ def main():
             "bbox": {"north": n, "west": w, "south": s_, "east": e},
             "step_deg": args.step,
             "param_units": "Pa/s (omega; negative = ascent)",
-            "mode": "areal" if r.ok else "point-scan",
+            "mode": "areal" if areal_ok else "point-scan",
         }
     }
     payload.update(build_output(rows, args.levels, args.top))
 
     os.makedirs(os.path.dirname(args.outfile), exist_ok=True)
-    with open(args.outfile, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+    if orjson is not None:
+        # C encoder; NaN values (unparseable cells) are written as null
+        with open(args.outfile, "wb") as f:
+            f.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+    else:
+        with open(args.outfile, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
     total_pts = sum(len(v) for v in payload["grids"].values())
     print(f"Wrote {args.outfile} with {total_pts} points across levels {args.levels}")
     return 0
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import orjson
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import meteomatics
+
+
+class _FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def _fake_get(url, auth=None, timeout=None):
+    ts, params, coords = url.split("/")[-4:-1]
+    points = [tuple(map(float, c.split(","))) for c in coords.split("+")]
+    data = [
+        {
+            "parameter": p,
+            "coordinates": [
+                {"lat": la, "lon": lo, "dates": [{"date": ts, "value": k + i * 10.0}]}
+                for i, (la, lo) in enumerate(points)
+            ],
+        }
+        for k, p in enumerate(params.split(","))
+    ]
+    return _FakeResponse(orjson.dumps({"status": "OK", "data": data}))
+
+
+@pytest.mark.parametrize("params", [None, ["t_2m:C", "cape:Jkg"]])
+def test_normalize_features_on_fetched_points(monkeypatch, params):
+    monkeypatch.setattr(meteomatics.SESSION, "get", _fake_get)
+    lats = [46.0, 46.1, 46.2, 46.3]
+    lons = [7.0, 7.1, 7.2, 7.3]
+    df = meteomatics.fetch_on_points("2025-07-15T12:00:00Z", lats, lons, "u", "p", params=params,
+                                      max_points_per_request=3)
+
+    out = meteomatics.normalize_features(df)
+
+    assert out["lat"].tolist() == lats
+    assert out["lon"].tolist() == lons
+    assert out["validdate"].tolist() == df["validdate"].tolist()
+    values = df["t_2m:C"].to_numpy()
+    expected = (values - values.mean()) / values.std()
+    assert out["t_2m:C"].to_numpy() == pytest.approx(expected, rel=1e-5)
+    if params is None:
+        assert {"wind_u_10m:ms", "wind_v_10m:ms"} <= set(out.columns)
+    # the input frame is left untouched
+    assert df["t_2m:C"].to_numpy() == pytest.approx(values)
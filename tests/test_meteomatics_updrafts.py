@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import meteomatics_updrafts as mu
+
+
+def test_build_output_long_format():
+    csv_text = (
+        "validdate;parameter;lat;lon;value\n"
+        "2025-07-15T12:00:00Z;wind_speed_w_700hPa:Pas;46.0;7.0;-0.5\n"
+        "2025-07-15T12:00:00Z;wind_speed_w_700hPa:Pas;46.1;7.1;-1.5\n"
+        "2025-07-15T12:00:00Z;wind_speed_w_500hPa:Pas;46.2;7.2;0.3\n"
+    )
+    out = mu.build_output(mu.parse_csv_rows(csv_text), [700, 500], top=1)
+    assert out["grids"]["700"] == [
+        {"lat": 46.1, "lon": 7.1, "value": -1.5},
+        {"lat": 46.0, "lon": 7.0, "value": -0.5},
+    ]
+    assert out["top"]["700"] == [{"lat": 46.1, "lon": 7.1, "value": -1.5}]
+    assert out["grids"]["500"] == [{"lat": 46.2, "lon": 7.2, "value": 0.3}]
+
+
+def test_build_output_non_long_format_csv_gives_empty_levels():
+    # wide layout (one column per parameter, no parameter/lat/lon/value columns)
+    csv_text = "validdate;wind_speed_w_700hPa:Pas\n2025-07-15T12:00:00Z;-0.4\n"
+    out = mu.build_output(mu.parse_csv_rows(csv_text), [700], top=5)
+    assert out["grids"] == {"700": []}
+    assert out["top"] == {"700": []}
+
+
+def test_build_output_empty_body():
+    out = mu.build_output(mu.parse_csv_rows(""), [700], top=5)
+    assert out["grids"] == {"700": []}
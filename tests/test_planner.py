@@ -0,0 +1,182 @@
+import itertools
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import generate as g
+import leg_kernel as lk
+
+# (start_h, arrival_floor, V_ias, sink, ws, wdir, wair, step_m)
+LEG_CASES = [
+    (1800.0, 900.0, 30.0, 0.8, 8.0, 260.0, 0.1, 800.0),
+    (2400.0, 1200.0, 25.0, 0.6, 0.0, 0.0, 0.0, 1000.0),
+    (9000.0, 8500.0, 35.0, 1.1, 14.0, 45.0, 2.0, 500.0),  # above the density table
+]
+
+
+def _legs(k=40, seed=0):
+    rng = np.random.default_rng(seed)
+    dists = rng.uniform(0.0, 60000.0, k)
+    dists[:2] = 0.0, 1.0  # zero-length and sub-step legs
+    return dists, rng.uniform(0.0, 360.0, k)
+
+
+def _stepwise(start_h, dists, tracks, arrival_floor, *rest):
+    """Reference: the scalar kernel as plain Python, one leg at a time."""
+    py = getattr(lk.sim_leg_geom, "py_func", lk.sim_leg_geom)
+    return np.array([py(start_h, d, t, arrival_floor, *rest) for d, t in zip(dists, tracks)]).T
+
+
+@pytest.mark.parametrize("case", LEG_CASES)
+def test_numpy_batch_matches_stepwise_kernel(case):
+    start_h, floor, *rest = case
+    dists, tracks = _legs()
+    got = np.array(lk._sim_legs_numpy(start_h, dists, tracks, floor, *rest))
+    np.testing.assert_allclose(got, _stepwise(start_h, dists, tracks, floor, *rest), rtol=1e-12, atol=1e-9)
+
+
+@pytest.mark.skipif(not lk.HAVE_NUMBA, reason="numba not installed")
+@pytest.mark.parametrize("case", LEG_CASES)
+def test_compiled_batch_matches_stepwise_kernel(case):
+    start_h, floor, *rest = case
+    dists, tracks = _legs()
+    ref = _stepwise(start_h, dists, tracks, floor, *rest)
+    serial = np.array(lk._sim_legs_serial(start_h, dists, tracks, floor, *rest))
+    parallel = np.array(lk._sim_legs_parallel(start_h, dists, tracks, floor, *rest))
+    np.testing.assert_allclose(serial, ref, rtol=1e-12, atol=1e-9)
+    np.testing.assert_array_equal(parallel, serial)
+    np.testing.assert_array_equal(np.array(lk.sim_legs_batch(start_h, dists, tracks, floor, *rest)), serial)
+
+
+class _PythonMet(g.MetProvider):
+    """Stock uniform met under another type, so legs take the generic Python loop."""
+
+
+POLAR = g.Polar(a=0.3, b=0.005, c=0.0012, bug_factor=1.1)
+
+# (wind_speed_ms, w_air_ms, start_h_msl); some have no feasible route
+ROUTE_CASES = [
+    (8.0, 0.1, 1800.0),
+    (12.0, -0.3, 2000.0),
+    (3.0, 0.0, 1500.0),
+    (0.0, 0.0, 2600.0),
+    (5.0, 0.0, 1000.0),
+]
+
+
+# Thermals between START and GOAL; every node links to every node east of it
+GRAPHS = [
+    [
+        g.Node("START", 45.000, 5.000),
+        g.Node("T1", 45.144, 5.123, thermal_net_ms=0.8, ceiling_msl=2191.0),
+        g.Node("T2", 45.057, 5.130, thermal_net_ms=1.6, ceiling_msl=2387.0),
+        g.Node("T3", 45.145, 5.186, thermal_net_ms=2.9, ceiling_msl=2084.0),
+        g.Node("T4", 45.109, 5.251, thermal_net_ms=2.2, ceiling_msl=2093.0),
+        g.Node("T5", 44.851, 5.418, thermal_net_ms=2.9, ceiling_msl=2098.0),
+        g.Node("T6", 44.976, 5.457, thermal_net_ms=2.7, ceiling_msl=2385.0),
+        g.Node("T7", 45.039, 5.545, thermal_net_ms=2.4, ceiling_msl=1830.0),
+        g.Node("T8", 45.133, 5.731, thermal_net_ms=1.4, ceiling_msl=1891.0),
+        g.Node("GOAL", 45.100, 6.000),
+    ],
+    [
+        g.Node("START", 45.000, 5.000),
+        g.Node("T1", 45.067, 5.064, thermal_net_ms=2.8, ceiling_msl=2616.0),
+        g.Node("T2", 44.851, 5.085, thermal_net_ms=2.6, ceiling_msl=1834.0),
+        g.Node("T3", 45.142, 5.279, thermal_net_ms=0.9, ceiling_msl=2663.0),
+        g.Node("T4", 45.067, 5.566, thermal_net_ms=1.2, ceiling_msl=2223.0),
+        g.Node("T5", 44.861, 5.591, thermal_net_ms=0.8, ceiling_msl=2471.0),
+        g.Node("T6", 45.109, 5.670, thermal_net_ms=2.0, ceiling_msl=2184.0),
+        g.Node("T7", 45.249, 5.741, thermal_net_ms=3.0, ceiling_msl=2486.0),
+        g.Node("T8", 45.110, 5.826, thermal_net_ms=2.2, ceiling_msl=2189.0),
+        g.Node("GOAL", 45.100, 6.000),
+    ],
+]
+
+
+def _graph(k):
+    ids = [n.id for n in GRAPHS[k]]
+    return {n.id: n for n in GRAPHS[k]}, {nid: ids[i + 1:] for i, nid in enumerate(ids)}
+
+
+def _route_kwargs(start_h):
+    return dict(start_h_msl=start_h, arrival_floor_each_leg_msl=900.0, polar=POLAR, step_m=800.0)
+
+
+def _brute_force(nodes, edges, met, **kw):
+    """Fastest plan over every START -> GOAL path, each flown with evaluate_path."""
+    best = None
+    stack = [["START"]]
+    while stack:
+        path = stack.pop()
+        if path[-1] == "GOAL":
+            plan = g.evaluate_path(path, nodes, met=met, **kw)
+            if plan is not None and (best is None or plan.total_time_s < best.total_time_s):
+                best = plan
+            continue
+        stack.extend(path + [v] for v in edges[path[-1]])
+    return best
+
+
+def _plans():
+    """A* plans for every graph and ROUTE_CASES as JSON-able dicts (None when infeasible)."""
+    out = []
+    for k, (ws, wair, start_h) in itertools.product(range(len(GRAPHS)), ROUTE_CASES):
+        nodes, edges = _graph(k)
+        try:
+            plan = g.find_route_with_thermals(nodes, edges, met=g.MetProvider(ws, 260.0, wair),
+                                              **_route_kwargs(start_h))
+        except RuntimeError:
+            out.append(None)
+            continue
+        out.append({"path": plan.path, "total_time_s": plan.total_time_s,
+                    "final_arrival_h_msl": plan.final_arrival_h_msl})
+    return out
+
+
+@pytest.mark.parametrize("ws, wair, start_h", ROUTE_CASES)
+@pytest.mark.parametrize("k", range(len(GRAPHS)))
+def test_astar_matches_brute_force(k, ws, wair, start_h):
+    nodes, edges = _graph(k)
+    kw = _route_kwargs(start_h)
+    ref = _brute_force(nodes, edges, _PythonMet(ws, 260.0, wair), **kw)
+    if ref is None:
+        with pytest.raises(RuntimeError):
+            g.find_route_with_thermals(nodes, edges, met=g.MetProvider(ws, 260.0, wair), **kw)
+        return
+    plan = g.find_route_with_thermals(nodes, edges, met=g.MetProvider(ws, 260.0, wair), **kw)
+    assert plan.path == ref.path
+    # The search reuses legs per 50 m altitude bin and the kernel reads ISA density
+    # from a table; evaluate_path's Python loop does neither
+    assert plan.total_time_s == pytest.approx(ref.total_time_s, rel=1e-4)
+    assert plan.final_arrival_h_msl == pytest.approx(ref.final_arrival_h_msl, rel=1e-4)
+
+    ids = list(nodes)
+    indptr = np.cumsum([0] + [len(edges[n]) for n in ids])
+    indices = np.array([ids.index(v) for n in ids for v in edges[n]])
+    csr_plan = g.find_route_with_thermals(nodes, edge_csr=(indptr, indices),
+                                          met=g.MetProvider(ws, 260.0, wair), **kw)
+    assert csr_plan == plan
+
+
+def test_routes_match_without_numba():
+    code = (
+        "import json, runpy, sys; sys.modules['numba'] = None; "
+        f"ns = runpy.run_path({os.path.abspath(__file__)!r}); "
+        "assert not ns['lk'].HAVE_NUMBA; print(json.dumps(ns['_plans']()))"
+    )
+    res = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    without = json.loads(res.stdout.strip().splitlines()[-1])
+    for got, want in zip(without, _plans(), strict=True):
+        if want is None:
+            assert got is None
+            continue
+        assert got["path"] == want["path"]
+        assert got["total_time_s"] == pytest.approx(want["total_time_s"], rel=1e-9)
+        assert got["final_arrival_h_msl"] == pytest.approx(want["final_arrival_h_msl"], rel=1e-9)
@@ -3,7 +3,9 @@
 weglide_client.py
 ------------------
 Zero-dependency (requests-only) client for WeGlide's public API.
-Focus: thermal replay + useful helpers.
+Focus: thermal replay + useful helpers. Responses are decoded with orjson
+when it is installed; with brotli / zstandard installed, requests also
+negotiates br / zstd compression on top of gzip and deflate.
 
 Usage (library):
     from weglide_client import WeGlideClient
@@ -27,15 +29,33 @@ try:
 except Exception as e:
     raise SystemExit("This client requires the 'requests' package. Install with: pip install requests") from e
 
+try:
+    import orjson
+except ImportError:  # optional: responses are decoded with the stdlib json module
+    orjson = None
+
 
 API_BASE = "https://api.weglide.org/v1"
 
 
+def _loads(content: bytes) -> Any:
+    """Decode a JSON body in C with orjson; anything it rejects (NaN literals,
+    non-UTF-8 encodings) goes through the stdlib parser as before."""
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(content)
+
+
 @dataclass
 class WeGlideClient:
     token: Optional[str] = None
     timeout: Union[int, float] = 30
     _session: Optional[requests.Session] = None
+    # Optional directory for conditional-GET caching (ETag / Last-Modified)
+    cache_dir: Optional[str] = None
 
     def __post_init__(self):
         if self._session is None:
@@ -43,7 +63,9 @@ class WeGlideClient:
             self._session.headers.update({"User-Agent": "weglide-client/1.0"})
             if self.token:
                 self._session.headers.update({"Authorization": f"Bearer {self.token}"})
-        # Allow token from env if not passed
+        # Allow cache directory and token from env if not passed
+        if not self.cache_dir:
+            self.cache_dir = os.getenv("WEGLIDE_CACHE_DIR") or None
         if not self.token:
             env_token = os.getenv("WEGLIDE_TOKEN")
             if env_token:
@@ -59,11 +81,9 @@ class WeGlideClient:
         """
         if time_unix is None:
             time_unix = int(_time.time())
-        url = f"{API_BASE}/thermal"
-        params = {"time": int(time_unix)}
-        r = self._session.get(url, params=params, timeout=self.timeout)
-        self._raise_for_status(r)
-        data = r.json()
+        # query folded into the URL: no params dict for requests to encode per call
+        t = int(time_unix)
+        data = self._get_json(f"{API_BASE}/thermal?time={t}", cache_key=f"thermal_{t}")
         if not isinstance(data, list):
             # Some endpoints return dict; thermal should be list of items.
             # Keep it robust by wrapping into list if needed.
@@ -75,9 +95,7 @@ class WeGlideClient:
         Fetch per-flight analysis (includes thermal aggregates per leg).
         """
         url = f"{API_BASE}/flightdetail/{flight_id}"
-        r = self._session.get(url, timeout=self.timeout)
-        self._raise_for_status(r)
-        return r.json()
+        return self._get_json(url, cache_key=f"flightdetail_{flight_id}")
 
     def get_fixes_batch(self, time_unix: Optional[int] = None) -> Dict[str, Any]:
         """
@@ -85,14 +103,60 @@ class WeGlideClient:
         """
         if time_unix is None:
             time_unix = int(_time.time())
-        url = f"{API_BASE}/fix/batch"
-        params = {"time": int(time_unix)}
-        r = self._session.get(url, params=params, timeout=self.timeout)
-        self._raise_for_status(r)
-        return r.json()
+        return self._get_json(f"{API_BASE}/fix/batch?time={int(time_unix)}")
 
     # -------------------------- Helpers --------------------------
 
+    def _get_json(self, url: str, cache_key: Optional[str] = None) -> Any:
+        """
+        GET and decode JSON. With cache_dir set, the body is kept on disk with its
+        ETag / Last-Modified and revalidated with a conditional request; a 304
+        answer is served from the cached body without downloading it again.
+        The cache is best-effort: unreadable or corrupt files count as a miss.
+        """
+        if not self.cache_dir or cache_key is None:
+            r = self._session.get(url, timeout=self.timeout)
+            self._raise_for_status(r)
+            return _loads(r.content)
+
+        body_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+        meta_path = os.path.join(self.cache_dir, f"{cache_key}.meta.json")
+        headers = {}
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if os.path.exists(body_path):
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+        except (OSError, ValueError, AttributeError):
+            headers = {}
+
+        r = self._session.get(url, headers=headers, timeout=self.timeout)
+        if r.status_code == 304 and headers:
+            try:
+                with open(body_path, "rb") as f:
+                    return _loads(f.read())
+            except (OSError, ValueError):
+                # cached body gone or corrupt: fetch it unconditionally
+                r = self._session.get(url, timeout=self.timeout)
+        self._raise_for_status(r)
+        data = _loads(r.content)
+
+        meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+        if meta["etag"] or meta["last_modified"]:
+            # body first, validators second: a meta file always has its body
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(body_path, "wb") as f:
+                    f.write(r.content)
+                with open(meta_path, "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+            except OSError:
+                pass
+        return data
+
     def _raise_for_status(self, r: requests.Response) -> None:
         try:
             r.raise_for_status()
@@ -126,10 +190,12 @@ def _cli(argv: List[str]) -> int:
     parser.add_argument("--token", help="Optional OAuth token (WEGLIDE_TOKEN env also accepted)")
     parser.add_argument("--timeout", type=float, default=30, help="HTTP timeout in seconds (default: 30)")
     parser.add_argument("--pretty", action="store_true", help="Pretty-print JSON")
+    parser.add_argument("--cache-dir", help="Cache responses here and revalidate them with conditional GETs "
+                                            "(WEGLIDE_CACHE_DIR env also accepted)")
 
     args = parser.parse_args(argv)
 
-    client = WeGlideClient(token=args.token, timeout=args.timeout)
+    client = WeGlideClient(token=args.token, timeout=args.timeout, cache_dir=args.cache_dir)
 
     if args.cmd == "thermal":
         data = client.get_thermals(time_unix=args.time)